@@ -0,0 +1,182 @@
+import os
+import json
+import asyncio
+import traceback
+
+import aio_pika
+
+from bot_consumer import (
+    assistant,
+    get_history,
+    record_turn,
+    save_bot_log,
+    report_history_stats,
+    HISTORY_STATS_INTERVAL,
+    RABBITMQ_HOST,
+    USER_LOG_EXCHANGE,
+    BOT_LOG_EXCHANGE,
+    USER_LOG_QUEUE,
+    USER_LOG_ROUTING_KEY,
+)
+
+"""
+Versão asyncio do BotConsumer. Cada turno passa quase todo o tempo esperando
+OpenAI, SQL Server e a API do Dude, então um único processo consegue manter
+centenas de conversas em andamento sem uma thread por usuário.
+"""
+
+BOT_ASYNC_PREFETCH = int(os.getenv("BOT_ASYNC_PREFETCH", "200"))
+
+
+class AsyncBotConsumer:
+    def __init__(
+        self,
+        prefetch: int = BOT_ASYNC_PREFETCH,
+        queue: str = USER_LOG_QUEUE,
+        exchange: str = USER_LOG_EXCHANGE,
+        routing_key: str = USER_LOG_ROUTING_KEY,
+    ):
+        self.prefetch = prefetch
+        self.queue = queue
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.bot_exchange = None
+        self._user_locks = {}
+        self._user_refs = {}
+        self._tasks = set()
+
+    async def publish_bot_response(self, user_id, bot_response):
+        """
+        Publica a resposta do bot para a exchange que a API C# (WebSocketHandler) escuta.
+        """
+        try:
+            payload = {"lastLog": bot_response}
+
+            await self.bot_exchange.publish(
+                aio_pika.Message(
+                    body=json.dumps(payload).encode(),
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key=user_id,
+            )
+            print(f" > [PRODUTOR] Resposta para '{user_id}' publicada com sucesso.")
+        except Exception as e:
+            print(f"   [!] ERRO ao publicar resposta para '{user_id}': {e}")
+            traceback.print_exc()
+
+    async def on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        """
+        Recebe a mensagem e dispara o processamento em uma task separada, para
+        que o consumo continue enquanto a IA responde.
+        """
+        try:
+            data = json.loads(message.body)
+            user_id = data.get("userId")
+            user_message = data.get("userMessage")
+        except Exception as e:
+            print(f"   [!] Mensagem com JSON inválido: {e}. Descartando.")
+            await message.ack()
+            return
+
+        if not user_id or not user_message:
+            print("   [!] Mensagem inválida, faltando userId ou userMessage. Descartando.")
+            await message.ack()
+            return
+
+        task = asyncio.create_task(self._process_message(message, user_id, user_message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_message(self, message, user_id, user_message):
+        # Um lock por usuário mantém a ordem das mensagens e o histórico consistente.
+        lock = self._user_locks.setdefault(user_id, asyncio.Lock())
+        self._user_refs[user_id] = self._user_refs.get(user_id, 0) + 1
+
+        try:
+            async with lock:
+                bot_response = None
+                try:
+                    # O store de histórico (Redis) é síncrono: fica fora do event loop.
+                    history = await asyncio.to_thread(get_history, user_id)
+                    bot_response = await assistant.arun(user_message, history)
+                    print(f"   [*] Resposta da IA: '{bot_response}'")
+
+                    await asyncio.to_thread(record_turn, user_id, user_message, bot_response)
+                    save_bot_log(user_id, bot_response)
+                except Exception as e:
+                    print(f"   [!] ERRO GERAL no processamento da mensagem: {e}")
+                    traceback.print_exc()
+
+                if bot_response is not None:
+                    await self.publish_bot_response(user_id, bot_response)
+
+                await message.ack()
+        finally:
+            self._user_refs[user_id] -= 1
+            if not self._user_refs[user_id]:
+                del self._user_refs[user_id]
+                del self._user_locks[user_id]
+
+    async def consume(self):
+        connection = await aio_pika.connect_robust(host=RABBITMQ_HOST, heartbeat=600)
+
+        async with connection:
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=self.prefetch)
+
+            user_exchange = await channel.declare_exchange(
+                self.exchange, aio_pika.ExchangeType.DIRECT, durable=False
+            )
+            self.bot_exchange = await channel.declare_exchange(
+                BOT_LOG_EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=False
+            )
+
+            queue = await channel.declare_queue(self.queue, durable=True)
+            await queue.bind(user_exchange, routing_key=self.routing_key)
+
+            await queue.consume(self.on_message)
+            stats_task = asyncio.create_task(self._report_stats())
+
+            print(
+                f"Bot (asyncio) conectado ao RabbitMQ (prefetch={self.prefetch}). "
+                "Aguardando mensagens..."
+            )
+            try:
+                await asyncio.Future()
+            finally:
+                stats_task.cancel()
+
+    async def _report_stats(self):
+        while True:
+            await asyncio.sleep(HISTORY_STATS_INTERVAL)
+            report_history_stats()
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.consume()
+            except aio_pika.exceptions.AMQPConnectionError as e:
+                print(
+                    f"Erro de conexão com o RabbitMQ: {e}. Tentando reconectar em 5 segundos..."
+                )
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"Um erro inesperado ocorreu no loop principal: {e}")
+                traceback.print_exc()
+                print("Tentando reiniciar em 10 segundos...")
+                await asyncio.sleep(10)
+
+    def main(self):
+        """Função principal que configura e inicia o consumidor asyncio."""
+        try:
+            asyncio.run(self.run_forever())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    bot_consumer = AsyncBotConsumer()
+    bot_consumer.main()
@@ -2,13 +2,15 @@ import os
 import pika
 import json
 import time
+import functools
 import traceback
 
 from src.agents.agents import IntelligentAssistant
-from src.db.bot_logs_saver import Bot_Logs
+from src.db.bot_logs_writer import BotLogWriter
+from src.consumer.user_ordered_pool import UserOrderedPool
+from src.history.chat_history_store import create_chat_history_store
 
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage, HumanMessage
 
 load_dotenv()
 
@@ -18,12 +20,60 @@ USER_LOG_EXCHANGE = os.getenv("USER_LOG_EXCHANGE")
 BOT_LOG_EXCHANGE = os.getenv("BOT_LOG_EXCHANGE")
 USER_LOG_QUEUE = os.getenv("USER_LOG_QUEUE")
 USER_LOG_ROUTING_KEY = os.getenv("USER_LOG_ROUTING_KEY")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+BOT_PREFETCH = int(os.getenv("BOT_PREFETCH", str(BOT_WORKERS * 2)))
+HISTORY_STATS_INTERVAL = int(os.getenv("HISTORY_STATS_INTERVAL", "600"))
 
 assistant = IntelligentAssistant()
-chat_histories = {}
+chat_histories = create_chat_history_store()
+bot_log_writer = BotLogWriter()
+
+
+def get_history(user_id):
+    # Sem histórico (ex.: Redis fora), a pergunta ainda é respondida, só sem contexto.
+    try:
+        return chat_histories.get_messages(user_id)
+    except Exception as e:
+        print(f"   [!] ERRO ao ler o histórico de '{user_id}': {e}. Seguindo sem histórico.")
+        return []
+
+
+def record_turn(user_id, user_message, bot_response):
+    # A resposta já foi calculada: uma falha aqui não pode impedir a publicação.
+    try:
+        chat_histories.append_turn(user_id, user_message, bot_response)
+    except Exception as e:
+        print(f"   [!] ERRO ao gravar o histórico de '{user_id}': {e}")
+
+
+def report_history_stats():
+    stats = chat_histories.stats()
+    print("[HISTÓRICO] " + " ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+def save_bot_log(user_id, bot_response):
+    try:
+        bot_log_writer.log(user_id, bot_response)
+    except Exception as db_error:
+        print(f"   [!] ERRO ao salvar no banco: {db_error}")
 
 
 class BotConsumer:
+    def __init__(
+        self,
+        workers: int = BOT_WORKERS,
+        prefetch: int = BOT_PREFETCH,
+        queue: str = USER_LOG_QUEUE,
+        exchange: str = USER_LOG_EXCHANGE,
+        routing_key: str = USER_LOG_ROUTING_KEY,
+    ):
+        self.workers = workers
+        self.prefetch = prefetch
+        self.queue = queue
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.pool = UserOrderedPool(max_workers=workers)
+
     def publish_bot_response(self, channel, user_id, bot_response):
         """
         Publica a resposta do bot para a exchange que a API C# (WebSocketHandler) escuta.
@@ -47,48 +97,82 @@ class BotConsumer:
 
     def on_message_callback(self, ch, method, properties, body):
         """
-        Função executada para cada mensagem de usuário recebida.
+        Função executada na thread da conexão para cada mensagem de usuário recebida.
+        O processamento é delegado ao pool de workers; o ack volta para esta thread.
         """
 
         try:
             data = json.loads(body)
             user_id = data.get("userId")
             user_message = data.get("userMessage")
+        except Exception as e:
+            print(f"   [!] Mensagem com JSON inválido: {e}. Descartando.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        if not user_id or not user_message:
+            print("   [!] Mensagem inválida, faltando userId ou userMessage. Descartando.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        self.pool.submit(
+            user_id,
+            self._process_message,
+            ch,
+            method.delivery_tag,
+            user_id,
+            user_message,
+        )
+
+    def handle_turn(self, user_id, user_message):
+        """
+        Executa um turno de conversa: chama a IA, atualiza o histórico e salva o log.
+        Roda em uma thread do pool; mensagens do mesmo usuário nunca rodam em paralelo.
+        """
+        bot_response = assistant.run(user_message, get_history(user_id))
+        print(f"   [*] Resposta da IA: '{bot_response}'")
 
-            if not user_id or not user_message:
-                print(
-                    "   [!] Mensagem inválida, faltando userId ou userMessage. Descartando."
-                )
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                return
-
-            if user_id not in chat_histories:
-                chat_histories[user_id] = []
-
-            current_history = chat_histories[user_id]
+        record_turn(user_id, user_message, bot_response)
+        save_bot_log(user_id, bot_response)
 
-            bot_response = assistant.run(user_message, current_history)
-            print(f"   [*] Resposta da IA: '{bot_response}'")
+        return bot_response
 
-            current_history.append(HumanMessage(content=user_message))
-            current_history.append(AIMessage(content=bot_response))
+    def _process_message(self, ch, delivery_tag, user_id, user_message):
+        bot_response = None
+        try:
+            bot_response = self.handle_turn(user_id, user_message)
+        except Exception as e:
+            print(f"   [!] ERRO GERAL no processamento da mensagem: {e}")
+            traceback.print_exc()
 
-            if len(current_history) > 20:
-                chat_histories[user_id] = current_history[-20:]
+        # O canal do pika não é thread-safe: publicação e ack são agendados
+        # na thread da conexão.
+        try:
+            ch.connection.add_callback_threadsafe(
+                functools.partial(
+                    self._finish_message, ch, delivery_tag, user_id, bot_response
+                )
+            )
+        except Exception as e:
+            print(
+                f"   [!] Conexão encerrada antes do ack da mensagem de '{user_id}': {e}"
+            )
 
-            try:
-                log_saver = Bot_Logs(bot_response, user_id)
-                log_saver.save_bot_response()
-            except Exception as db_error:
-                print(f"   [!] ERRO ao salvar no banco: {db_error}")
+    def _finish_message(self, ch, delivery_tag, user_id, bot_response):
+        if not ch.is_open:
+            print(f"   [!] Canal fechado, mensagem de '{user_id}' será reentregue.")
+            return
 
+        if bot_response is not None:
             self.publish_bot_response(ch, user_id, bot_response)
 
-        except Exception as e:
-            print(f"   [!] ERRO GERAL no processamento da mensagem: {e}")
-            traceback.print_exc()
+        ch.basic_ack(delivery_tag=delivery_tag)
 
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+    def _report_stats(self, connection):
+        report_history_stats()
+        connection.call_later(
+            HISTORY_STATS_INTERVAL, lambda: self._report_stats(connection)
+        )
 
     def main(self):
         """Função principal que configura e inicia o consumidor RabbitMQ."""
@@ -99,26 +183,32 @@ class BotConsumer:
                 )
                 channel = connection.channel()
 
-                print("Bot conectado ao RabbitMQ. Aguardando mensagens...")
+                print(
+                    f"Bot conectado ao RabbitMQ com {self.workers} workers "
+                    f"(prefetch={self.prefetch}). Aguardando mensagens..."
+                )
 
                 channel.exchange_declare(
-                    exchange=USER_LOG_EXCHANGE, exchange_type="direct", durable=False
+                    exchange=self.exchange, exchange_type="direct", durable=False
                 )
                 channel.exchange_declare(
                     exchange=BOT_LOG_EXCHANGE, exchange_type="direct", durable=False
                 )
 
-                channel.queue_declare(queue=USER_LOG_QUEUE, durable=True)
+                channel.queue_declare(queue=self.queue, durable=True)
 
                 channel.queue_bind(
-                    queue=USER_LOG_QUEUE,
-                    exchange=USER_LOG_EXCHANGE,
-                    routing_key=USER_LOG_ROUTING_KEY,
+                    queue=self.queue,
+                    exchange=self.exchange,
+                    routing_key=self.routing_key,
                 )
 
-                channel.basic_qos(prefetch_count=1)
+                channel.basic_qos(prefetch_count=self.prefetch)
                 channel.basic_consume(
-                    queue=USER_LOG_QUEUE, on_message_callback=self.on_message_callback
+                    queue=self.queue, on_message_callback=self.on_message_callback
+                )
+                connection.call_later(
+                    HISTORY_STATS_INTERVAL, lambda: self._report_stats(connection)
                 )
 
                 channel.start_consuming()
@@ -131,6 +221,7 @@ class BotConsumer:
             except KeyboardInterrupt:
                 if "connection" in locals() and connection.is_open:
                     connection.close()
+                self.pool.shutdown(wait=False)
                 break
             except Exception as e:
                 print(f"Um erro inesperado ocorreu no loop principal: {e}")
@@ -1,4 +1,29 @@
-from bot_consumer import BotConsumer
+import os
 
-cosumer = BotConsumer()
-cosumer.main()
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "blocking" (pika + pool de threads) ou "async" (aio-pika + asyncio).
+# Com BOT_SHARDED=true, sobe BOT_SHARDS processos desse tipo, com os usuários
+# distribuídos entre eles por hash consistente.
+BOT_CONSUMER_MODE = os.getenv("BOT_CONSUMER_MODE", "blocking").lower()
+BOT_SHARDED = os.getenv("BOT_SHARDED", "false").lower() == "true"
+
+# O guard é necessário no modo shardeado: os processos filhos (spawn)
+# reimportam este módulo.
+if __name__ == "__main__":
+    if BOT_SHARDED:
+        from sharded_consumer import ShardedBotConsumer
+
+        cosumer = ShardedBotConsumer()
+    elif BOT_CONSUMER_MODE == "async":
+        from async_bot_consumer import AsyncBotConsumer
+
+        cosumer = AsyncBotConsumer()
+    else:
+        from bot_consumer import BotConsumer
+
+        cosumer = BotConsumer()
+
+    cosumer.main()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import traceback
+import multiprocessing
+
+import pika
+from dotenv import load_dotenv
+
+from src.consumer.hash_ring import ConsistentHashRing
+
+"""
+Modo shardeado: o processo principal roteia cada mensagem da USER_LOG_QUEUE para
+um shard escolhido por hash consistente do userId, e cada shard é um processo
+consumidor com a sua própria fila. Assim cada usuário é sempre atendido pelo
+mesmo processo, que guarda o histórico dele sem precisar de locks entre processos.
+
+O processo principal não importa o bot_consumer, para não criar um
+IntelligentAssistant que nunca seria usado; cada shard cria o seu.
+"""
+
+load_dotenv()
+
+# --- CONFIGS ---
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST")
+USER_LOG_EXCHANGE = os.getenv("USER_LOG_EXCHANGE")
+USER_LOG_QUEUE = os.getenv("USER_LOG_QUEUE")
+USER_LOG_ROUTING_KEY = os.getenv("USER_LOG_ROUTING_KEY")
+SHARD_EXCHANGE = os.getenv("SHARD_EXCHANGE", "user_log_shards")
+BOT_SHARDS = int(os.getenv("BOT_SHARDS", str(os.cpu_count() or 1)))
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index}"
+
+
+def shard_queue(index: int) -> str:
+    return f"{USER_LOG_QUEUE}.{shard_name(index)}"
+
+
+def run_shard(index: int):
+    """Ponto de entrada de cada processo shard."""
+    kwargs = {
+        "queue": shard_queue(index),
+        "exchange": SHARD_EXCHANGE,
+        "routing_key": shard_name(index),
+    }
+    # Antes de importar o consumidor: o BotLogWriter usa arquivos locais do shard.
+    os.environ["BOT_LOG_SHARD"] = shard_name(index)
+
+    if os.getenv("BOT_CONSUMER_MODE", "blocking").lower() == "async":
+        from async_bot_consumer import AsyncBotConsumer
+
+        consumer = AsyncBotConsumer(**kwargs)
+    else:
+        from bot_consumer import BotConsumer
+
+        consumer = BotConsumer(**kwargs)
+
+    print(f"[{shard_name(index)}] Consumindo a fila '{kwargs['queue']}'.")
+    consumer.main()
+
+
+class ShardedBotConsumer:
+    def __init__(self, shards: int = BOT_SHARDS):
+        self.shards = shards
+        self.ring = ConsistentHashRing([shard_name(i) for i in range(shards)])
+        self.processes = {}
+        self._context = multiprocessing.get_context("spawn")
+
+    def _start_shard(self, index: int):
+        process = self._context.Process(
+            target=run_shard, args=(index,), name=shard_name(index), daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def _supervise(self, connection):
+        """Reinicia shards que morreram e se reagenda na thread da conexão."""
+        for index, process in list(self.processes.items()):
+            if not process.is_alive():
+                print(
+                    f"   [!] {shard_name(index)} encerrou (exitcode={process.exitcode}). Reiniciando..."
+                )
+                self._start_shard(index)
+
+        connection.call_later(5, lambda: self._supervise(connection))
+
+    def _declare_topology(self, channel):
+        channel.exchange_declare(
+            exchange=USER_LOG_EXCHANGE, exchange_type="direct", durable=False
+        )
+        channel.exchange_declare(
+            exchange=SHARD_EXCHANGE, exchange_type="direct", durable=False
+        )
+
+        channel.queue_declare(queue=USER_LOG_QUEUE, durable=True)
+        channel.queue_bind(
+            queue=USER_LOG_QUEUE,
+            exchange=USER_LOG_EXCHANGE,
+            routing_key=USER_LOG_ROUTING_KEY,
+        )
+
+        # As filas dos shards são declaradas aqui também, para que nenhuma
+        # mensagem roteada se perca enquanto um shard ainda está subindo.
+        for index in range(self.shards):
+            channel.queue_declare(queue=shard_queue(index), durable=True)
+            channel.queue_bind(
+                queue=shard_queue(index),
+                exchange=SHARD_EXCHANGE,
+                routing_key=shard_name(index),
+            )
+
+    def on_message_callback(self, ch, method, properties, body):
+        """Encaminha a mensagem ao shard dono do userId."""
+        try:
+            user_id = json.loads(body).get("userId")
+        except Exception:
+            user_id = None
+
+        if not user_id:
+            print("   [!] Mensagem sem userId válido. Descartando.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        target = self.ring.get_node(str(user_id))
+        try:
+            ch.basic_publish(
+                exchange=SHARD_EXCHANGE,
+                routing_key=target,
+                body=body,
+                properties=pika.BasicProperties(
+                    content_type="application/json",
+                    delivery_mode=2,
+                ),
+                mandatory=True,
+            )
+        except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+            print(f"   [!] Falha ao rotear mensagem de '{user_id}' para {target}: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def main(self):
+        """Sobe os shards e roteia as mensagens até ser interrompido."""
+        for index in range(self.shards):
+            self._start_shard(index)
+
+        while True:
+            try:
+                connection = pika.BlockingConnection(
+                    pika.ConnectionParameters(host=RABBITMQ_HOST, heartbeat=600)
+                )
+                channel = connection.channel()
+                # Com confirmação do broker, o ack da fila original só é enviado
+                # depois que a mensagem foi aceita na fila do shard.
+                channel.confirm_delivery()
+
+                self._declare_topology(channel)
+
+                print(
+                    f"Roteador conectado ao RabbitMQ com {self.shards} shards. Aguardando mensagens..."
+                )
+
+                channel.basic_qos(prefetch_count=100)
+                channel.basic_consume(
+                    queue=USER_LOG_QUEUE, on_message_callback=self.on_message_callback
+                )
+                connection.call_later(5, lambda: self._supervise(connection))
+
+                channel.start_consuming()
+
+            except pika.exceptions.AMQPConnectionError as e:
+                print(
+                    f"Erro de conexão com o RabbitMQ: {e}. Tentando reconectar em 5 segundos..."
+                )
+                time.sleep(5)
+            except KeyboardInterrupt:
+                if "connection" in locals() and connection.is_open:
+                    connection.close()
+                for process in self.processes.values():
+                    process.terminate()
+                break
+            except Exception as e:
+                print(f"Um erro inesperado ocorreu no loop principal: {e}")
+                traceback.print_exc()
+                print("Tentando reiniciar em 10 segundos...")
+                time.sleep(10)
+
+
+if __name__ == "__main__":
+    sharded_consumer = ShardedBotConsumer()
+    sharded_consumer.main()
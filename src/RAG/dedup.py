@@ -0,0 +1,187 @@
+import re
+import random
+import hashlib
+from array import array
+from collections import Counter, defaultdict
+
+from src.RAG.manifest import IndexManifest, content_hash
+
+"""
+Eliminação de chunks duplicados antes do embedding: duplicatas exatas pelo hash
+do conteúdo e quase-duplicatas por MinHash/LSH (trechos repetidos no mesmo
+documento, revisões do mesmo manual). As assinaturas ficam no manifesto,
+então uma execução incremental também compara com o que já está indexado.
+
+A comparação é feita só dentro da mesma origem (source_table e file_name): um
+chunk descartado em favor de outro arquivo ou tabela sumiria das buscas com
+source_filter e da partição da sua tabela.
+"""
+
+# Primo de Mersenne 2^61 - 1: as permutações são (a*h + b) mod P.
+_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def choose_bands(num_perm: int, threshold: float) -> tuple:
+    """
+    (bandas, linhas por banda) cujo limiar do LSH, (1/b)^(1/r), fica logo abaixo
+    do limiar pedido: os candidatos incluem os pares reais, e a similaridade
+    estimada decide depois.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.permutations = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> set:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {
+            " ".join(words[i : i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> list:
+        hashes = [_shingle_hash(shingle) for shingle in self.shingles(text)]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self.permutations]
+
+
+def dedup_scope(metadata: dict) -> str:
+    """Origem dentro da qual os chunks são comparados."""
+    return f"{metadata.get('source_table') or ''}\0{metadata.get('file_name') or ''}"
+
+
+def estimate_similarity(sig_a: list, sig_b: list) -> float:
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class ChunkDeduplicator:
+    """
+    Filtra os chunks de cada documento contra o que já foi mantido da mesma
+    origem (nesta execução e nas anteriores). O primeiro chunk visto é mantido; os repetidos
+    são descartados e registrados com a referência ao chunk mantido.
+    """
+
+    def __init__(
+        self,
+        manifest: IndexManifest,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        shingle_size: int = 5,
+    ):
+        self.manifest = manifest
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self.report = {
+            "chunks": 0,
+            "exact": 0,
+            "near": 0,
+            "chars_removed": 0,
+            "by_source": defaultdict(Counter),
+        }
+
+    def _buckets(self, signature: list) -> list:
+        return [
+            f"{band}:"
+            + hashlib.blake2b(
+                array("Q", signature[band * self.rows : (band + 1) * self.rows]).tobytes(),
+                digest_size=8,
+            ).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def filter(self, doc, chunks: list) -> tuple:
+        """Retorna (chunks mantidos, duplicatas) do documento."""
+        doc_key = doc.metadata["doc_key"]
+        source_table = doc.metadata.get("source_table")
+        scope = dedup_scope(doc.metadata)
+        current_ids = {chunk.metadata["chunk_id"] for chunk in chunks}
+
+        # Versões antigas dos chunks deste documento não servem de referência.
+        self.manifest.forget_signatures(doc_key, keep=current_ids)
+
+        def is_reference(candidate_id: str) -> bool:
+            # Chunks deste documento só valem como referência depois de mantidos
+            # nesta passada (numa execução retomada, o próprio chunk já está lá).
+            return candidate_id not in current_ids or candidate_id in kept_ids
+
+        kept, duplicates, kept_ids = [], [], set()
+        for chunk in chunks:
+            cid = chunk.metadata["chunk_id"]
+            chunk_hash = content_hash(chunk.page_content)
+            self.report["chunks"] += 1
+
+            match = next(
+                (
+                    (candidate_id, "exact", 1.0)
+                    for candidate_id in self.manifest.exact_candidates(chunk_hash, scope)
+                    if is_reference(candidate_id)
+                ),
+                None,
+            )
+
+            signature = buckets = None
+            if match is None:
+                signature = self.hasher.signature(chunk.page_content)
+                buckets = self._buckets(signature)
+                best = None
+                for candidate_id, candidate_sig in self.manifest.lsh_candidates(buckets, scope):
+                    if not is_reference(candidate_id):
+                        continue
+                    similarity = estimate_similarity(signature, candidate_sig)
+                    if similarity >= self.threshold and (best is None or similarity > best[2]):
+                        best = (candidate_id, "near", similarity)
+                match = best
+
+            if match is not None:
+                kept_id, kind, similarity = match
+                duplicates.append(
+                    (cid, doc_key, source_table, chunk.metadata.get("file_name"), kept_id, kind, similarity)
+                )
+                self.report[kind] += 1
+                self.report["chars_removed"] += len(chunk.page_content)
+                self.report["by_source"][source_table][kind] += 1
+                continue
+
+            self.manifest.add_signature(cid, doc_key, chunk_hash, signature, buckets, scope)
+            kept.append(chunk)
+            kept_ids.add(cid)
+
+        return kept, duplicates
+
+    def print_report(self):
+        report = self.report
+        removed = report["exact"] + report["near"]
+        if not report["chunks"]:
+            return
+        print(
+            f"Deduplicação: {removed} de {report['chunks']} fragmentos descartados "
+            f"({report['exact']} exatos, {report['near']} quase idênticos, "
+            f"{report['chars_removed']} caracteres a menos para embedar)."
+        )
+        for source_table, counts in sorted(report["by_source"].items()):
+            print(
+                f"  - {source_table}: {counts['exact']} exatos, {counts['near']} quase idênticos"
+            )
@@ -0,0 +1,234 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.history.chat_history_store import estimate_tokens
+
+"""
+Agendador de embeddings para a indexação: monta lotes pelo número de tokens,
+envia vários lotes em paralelo e ajusta a concorrência conforme a resposta da
+API (reduz pela metade ao receber 429, cresce devagar enquanto a latência está
+boa). Os resultados voltam para a thread que chamou run(), que é a única a
+gravar no vector store.
+"""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(
+        getattr(error, "response", None), "status_code", None
+    )
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def is_transient_error(error: Exception) -> bool:
+    return type(error).__name__ in (
+        "APIConnectionError",
+        "APITimeoutError",
+        "InternalServerError",
+        "ConnectionError",
+        "Timeout",
+    )
+
+
+def retry_after_seconds(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler:
+    def __init__(
+        self,
+        embedder: Embeddings,
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 512,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        initial_concurrency: int = 2,
+        target_latency: float = 10.0,
+        max_retries: int = 8,
+    ):
+        self.embedder = embedder
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+
+        self.concurrency = float(initial_concurrency)
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "texts": 0, "rate_limited": 0, "retries": 0}
+
+    def _batches(self, chunks: Iterable[Document]) -> Iterator[List[Document]]:
+        batch, tokens = [], 0
+        for chunk in chunks:
+            chunk_tokens = estimate_tokens(chunk.page_content)
+            if batch and (
+                tokens + chunk_tokens > self.max_batch_tokens
+                or len(batch) >= self.max_batch_size
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(chunk)
+            tokens += chunk_tokens
+        if batch:
+            yield batch
+
+    def _on_success(self, latency: float):
+        with self._lock:
+            if latency <= self.target_latency:
+                # Aumento aditivo: +1 a cada "rodada" completa de lotes.
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1 / self.concurrency
+                )
+            else:
+                self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+
+    def _on_rate_limit(self):
+        with self._lock:
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            self.stats["rate_limited"] += 1
+
+    def _embed_with_retry(self, batch: List[Document]) -> List[List[float]]:
+        texts = [chunk.page_content for chunk in batch]
+        attempt = 0
+
+        while True:
+            started = time.monotonic()
+            try:
+                embeddings = self.embedder.embed_documents(texts)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                if not (rate_limited or is_transient_error(e)) or attempt >= self.max_retries:
+                    raise
+
+                if rate_limited:
+                    self._on_rate_limit()
+                with self._lock:
+                    self.stats["retries"] += 1
+
+                delay = retry_after_seconds(e) or min(60.0, 2**attempt)
+                time.sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
+                continue
+
+            self._on_success(time.monotonic() - started)
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["texts"] += len(texts)
+            return embeddings
+
+    def run(
+        self, chunks: Iterable[Document]
+    ) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+        """
+        Embeda os chunks e gera (lote, embeddings) na ordem em que os lotes terminam.
+        Os chunks são consumidos sob demanda: só há 'concurrency' lotes em memória.
+        """
+        batches = self._batches(chunks)
+        exhausted = False
+        in_flight = {}
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="embedding"
+        ) as executor:
+            try:
+                while True:
+                    while not exhausted and len(in_flight) < int(self.concurrency):
+                        batch = next(batches, None)
+                        if batch is None:
+                            exhausted = True
+                            break
+                        in_flight[executor.submit(self._embed_with_retry, batch)] = batch
+
+                    if not in_flight:
+                        return
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = in_flight.pop(future)
+                        yield batch, future.result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeEmbeddingEndpoint(Embeddings):
+    """
+    Dublê do endpoint de embeddings para testes e benchmark offline: simula
+    latência por requisição (fixa + proporcional aos tokens) e uma cota de tokens
+    por segundo que responde 429.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = 8,
+        latency: float = 0.2,
+        latency_per_1k_tokens: float = 0.01,
+        tokens_per_second: int = 1_000_000,
+    ):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self.rejected = 0
+        self._window_start = time.monotonic()
+        self._window_tokens = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        rng = random.Random(text)
+        return [rng.uniform(-1, 1) for _ in range(self.dimensions)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._window_start, self._window_tokens = now, 0
+            if self._window_tokens + tokens > self.tokens_per_second:
+                self.rejected += 1
+                raise FakeRateLimitError("429 Too Many Requests")
+            self._window_tokens += tokens
+            self.requests += 1
+
+        time.sleep(self.latency + tokens / 1000 * self.latency_per_1k_tokens)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+if __name__ == "__main__":
+    # Benchmark offline: lotes fixos em sequência x agendador concorrente.
+    chunks = [Document(page_content=f"trecho {i} " * 150) for i in range(3000)]
+
+    endpoint = FakeEmbeddingEndpoint(latency=0.3, tokens_per_second=10_000_000)
+    started = time.monotonic()
+    for i in range(0, len(chunks), 300):
+        endpoint.embed_documents([c.page_content for c in chunks[i : i + 300]])
+    print(f"Sequencial (lotes de 300): {time.monotonic() - started:.2f}s")
+
+    for label, tokens_per_second in (("sem cota", 10_000_000), ("cota apertada", 150_000)):
+        # Com a cota apertada o agendador recebe 429 e precisa reduzir a concorrência.
+        endpoint = FakeEmbeddingEndpoint(latency=0.3, tokens_per_second=tokens_per_second)
+        scheduler = EmbeddingScheduler(endpoint, max_batch_tokens=20_000)
+        started = time.monotonic()
+        total = sum(len(batch) for batch, _ in scheduler.run(chunks))
+        print(
+            f"Agendador ({label}): {total} chunks em {time.monotonic() - started:.2f}s, "
+            f"concorrência final {scheduler.concurrency:.1f}, {scheduler.stats}"
+        )
@@ -1,13 +1,55 @@
 import os
+import sys
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
-import pyodbc
 import fitz
 
+from src.db.connection_pool import get_pool
+from src.cache.cache import ManualCachedEmbedder
+from src.RAG.retriever import RAG_INDEX_PATH, RAG_VECTOR_BACKEND, open_vector_store
+from src.RAG.mmap_vector_store import MmapVectorStore
+from src.RAG.partitioned_chroma import PartitionedChroma
+from src.RAG.manifest import IndexManifest, chunk_id, content_hash, document_hash
+from src.RAG.embedding_scheduler import EmbeddingScheduler
+from src.RAG.dedup import ChunkDeduplicator
+from src.RAG.lexical_index import LexicalIndex
+
+JSON_SOURCE_TABLES = [
+    "tecelagem_e_revisao",
+    "mantas",
+    "recepcao_de_materiais",
+    "preparacao_de_fios",
+    "pean_sean_felts_PSF",
+    "metrologia",
+    "expedicao",
+    "acabamento",
+]
+PDF_SOURCE_TABLES = ["DocumentosPDF"]
+
+# Linhas lidas por ida ao banco; PDFs vêm em blocos menores por serem grandes.
+ROW_FETCH_SIZE = 500
+PDF_FETCH_SIZE = 8
+
+
+def iter_rows(cursor, size: int = ROW_FETCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def extract_pdf_text(pdf_binary_data: bytes) -> str:
+    """Extrai o texto de um PDF em memória. Roda nos processos do pool de extração."""
+    with fitz.open(stream=pdf_binary_data, filetype="pdf") as doc:
+        return "".join(page.get_text("text") for page in doc)
+
 
 class RAGIndexer:
     def __init__(
@@ -17,149 +59,141 @@ class RAGIndexer:
         chunk_size: int = 1000,
         chunk_overlap: int = 100,
         db_config: dict = None,
+        batch_size: int = 300,
+        extraction_workers: int = None,
+        max_batch_tokens: int = 50_000,
+        embedding_concurrency: int = 8,
+        dedup_threshold: float = 0.9,
+        vector_backend: str = RAG_VECTOR_BACKEND,
     ):
         self.persist_directory = persist_directory
-        self.embeddings = OpenAIEmbeddings(model=embedding_model)
+        # Com o cache persistente, chunks que não mudaram entre execuções não
+        # voltam a ser enviados à API. As novas tentativas ficam a cargo do
+        # agendador, que precisa enxergar os 429 para ajustar a concorrência.
+        self.embeddings = ManualCachedEmbedder(
+            base_embedder=OpenAIEmbeddings(model=embedding_model, max_retries=0),
+            model_name=embedding_model,
+        )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size, chunk_overlap=chunk_overlap
         )
         self.db_config = db_config
+        # Lotes limitados por quantidade de chunks e por tokens estimados.
+        self.batch_size = batch_size
+        self.scheduler = EmbeddingScheduler(
+            self.embeddings,
+            max_batch_tokens=max_batch_tokens,
+            max_batch_size=batch_size,
+            max_concurrency=embedding_concurrency,
+        )
+        self.extraction_workers = extraction_workers or os.cpu_count() or 1
+        # Similaridade (Jaccard estimada) a partir da qual um chunk é descartado
+        # como quase-duplicata. None desliga a deduplicação.
+        self.dedup_threshold = dedup_threshold
+        self.vector_backend = vector_backend
+        # Tabelas cuja leitura falhou nesta execução: os documentos delas não
+        # podem ser tratados como apagados.
+        self.failed_sources = set()
 
     def _get_db_connection(self):
+        """Contexto com uma conexão do pool; sem configuração, entrega None."""
         if not self.db_config:
             print("Erro: Configuração do banco de dados não fornecida.")
-            return None
+            return nullcontext()
 
         conn_str = (
             f"DRIVER={self.db_config['driver']};SERVER={self.db_config['server']};"
             f"DATABASE={self.db_config['database']};UID={self.db_config['uid']};"
             f"PWD={self.db_config['pwd']};charset='UTF-8'"
         )
-        try:
-            conn = pyodbc.connect(conn_str)
-            return conn
-        except pyodbc.Error as ex:
-            print(f"Erro ao conectar ao SQL Server: {ex}")
-            return None
-
-    def _load_docs_from_pdf_in_db(
+        return get_pool(conn_str, name=self.db_config["database"]).connection()
+
+    def _iter_pdf_rows(self, cursor, table_name: str):
+        """Lê as linhas em blocos (fetchmany), sem carregar todos os PDFs na memória."""
+        while True:
+            rows = cursor.fetchmany(PDF_FETCH_SIZE)
+            if not rows:
+                return
+            for pdf_id, pdf_filename, pdf_binary_data in rows:
+                if not pdf_binary_data:
+                    continue
+                print(f"  - Processando PDF: ID={pdf_id}, Nome='{pdf_filename}'")
+                yield pdf_id, pdf_filename, pdf_binary_data
+
+    def _iter_docs_from_pdf_in_db(
         self,
         table_name: str,
         id_column: str = "id",
         filename_column: str = "file_name",
         content_column: str = "pdf_content",
-    ) -> list[Document]:
-        documents = []
+    ):
+        """
+        Gera os documentos dos PDFs da tabela à medida que são extraídos. A extração
+        roda num pool de processos, com no máximo 2 PDFs por worker em andamento.
+        """
+        collected = 0
         print(f"Buscando PDFs da tabela '{table_name}' para extração de texto...")
 
         try:
             with self._get_db_connection() as conn:
                 if not conn:
-                    return []
-                with conn.cursor() as cursor:
+                    return
+                with conn.cursor() as cursor, ProcessPoolExecutor(
+                    max_workers=self.extraction_workers
+                ) as executor:
                     query = f"SELECT {id_column}, {filename_column}, {content_column} FROM {table_name}"
                     cursor.execute(query)
 
-                    for row in cursor.fetchall():
-                        pdf_id = row[0]
-                        pdf_filename = row[1]
-                        pdf_binary_data = row[2]
+                    in_flight = deque()
+                    rows = self._iter_pdf_rows(cursor, table_name)
 
-                        if not pdf_binary_data:
-                            continue
+                    while True:
+                        for pdf_id, pdf_filename, pdf_binary_data in rows:
+                            future = executor.submit(extract_pdf_text, pdf_binary_data)
+                            in_flight.append((pdf_id, pdf_filename, future))
+                            if len(in_flight) >= self.extraction_workers * 2:
+                                break
 
-                        print(
-                            f"  - Processando PDF: ID={pdf_id}, Nome='{pdf_filename}'"
-                        )
+                        if not in_flight:
+                            break
 
+                        pdf_id, pdf_filename, future = in_flight.popleft()
                         try:
-                            # Abre o PDF a partir dos dados binários em memória
-                            with fitz.open(
-                                stream=pdf_binary_data, filetype="pdf"
-                            ) as doc:
-                                extracted_text = ""
-                                for page in doc:
-                                    extracted_text += page.get_text("text")
-
-                                if extracted_text:
-                                    metadata = {
-                                        "source_table": table_name,
-                                        "file_name": pdf_filename,
-                                        "content_column": content_column,
-                                    }
-                                    documents.append(
-                                        Document(
-                                            page_content=extracted_text,
-                                            metadata=metadata,
-                                        )
-                                    )
-
+                            extracted_text = future.result()
                         except Exception as e:
                             print(
                                 f"    ERRO: Não foi possível processar o PDF com ID={pdf_id}. Erro: {e}"
                             )
+                            continue
+
+                        if extracted_text:
+                            metadata = {
+                                "source_table": table_name,
+                                "file_name": pdf_filename,
+                                "content_column": content_column,
+                                "doc_key": f"{table_name}:{pdf_id}",
+                            }
+                            collected += 1
+                            yield Document(page_content=extracted_text, metadata=metadata)
 
             print(
-                f"Extração concluída. Coletados {len(documents)} documentos a partir dos PDFs."
+                f"Extração concluída. Coletados {collected} documentos a partir dos PDFs."
             )
         except Exception as e:
             print(f"Erro geral ao buscar dados da tabela de PDF '{table_name}': {e}")
+            self.failed_sources.add(table_name)
 
-        return documents
-
-    def _extract_content_and_metadata(
-        self,
-        row_data: dict,
-        table_name: str,
-        name_column: str = None,
-        doc_type: str = None,
-    ) -> Document:
-        metadata = {"source_table": table_name}
-        if "id" in row_data:
-            metadata["id"] = row_data["id"]
-        if name_column and name_column in row_data:
-            metadata["file_name"] = row_data[name_column]
-        if doc_type:
-            metadata["type"] = doc_type
-
-        clean_row_data = {k: str(v or "").strip() for k, v in row_data.items()}
-        content_for_page = json.dumps(clean_row_data, ensure_ascii=False, indent=2)
-        return Document(page_content=content_for_page, metadata=metadata)
-
-    def _load_data_from_sql(
-        self, table_name: str, name_column: str = None, doc_type: str = None
-    ) -> list[Document]:
-        documents = []
-        try:
-            with self._get_db_connection() as conn:
-                if not conn:
-                    return []
-                with conn.cursor() as cursor:
-                    cursor.execute(f"SELECT * FROM {table_name}")
-                    columns = [column[0] for column in cursor.description]
-
-                    for row in cursor.fetchall():
-                        row_dict = dict(zip(columns, row))
-                        doc = self._extract_content_and_metadata(
-                            row_dict, table_name, name_column, doc_type
-                        )
-                        documents.append(doc)
-            print(f"Coletados {len(documents)} documentos da tabela '{table_name}'.")
-        except Exception as e:
-            print(f"Erro ao processar dados da tabela '{table_name}': {e}")
-        return documents
-
-    def _load_docs_from_json_column(
+    def _iter_docs_from_json_column(
         self,
         table_name: str,
         content_column: str = "file_content",
         metadata_columns: list = ["id", "file_name"],
-    ) -> list[Document]:
-        documents = []
+    ):
+        collected = 0
         try:
             with self._get_db_connection() as conn:
                 if not conn:
-                    return []
+                    return
                 with conn.cursor() as cursor:
                     columns_to_select = ", ".join(metadata_columns + [content_column])
                     cursor.execute(f"SELECT {columns_to_select} FROM {table_name}")
@@ -167,7 +201,7 @@ class RAGIndexer:
                         f"Buscando e processando documentos da tabela '{table_name}' (formato JSON)..."
                     )
                     cols = [column[0] for column in cursor.description]
-                    for row in cursor.fetchall():
+                    for row in iter_rows(cursor):
                         row_dict = dict(zip(cols, row))
                         json_string = row_dict.get(content_column)
                         if not json_string:
@@ -184,77 +218,319 @@ class RAGIndexer:
                             for col in metadata_columns:
                                 if col in row_dict:
                                     metadata[col] = row_dict[col]
-                            documents.append(
-                                Document(page_content=page_content, metadata=metadata)
-                            )
+                            row_key = row_dict.get("id") or content_hash(page_content)
+                            metadata["doc_key"] = f"{table_name}:{row_key}"
+                            collected += 1
+                            yield Document(page_content=page_content, metadata=metadata)
                         except json.JSONDecodeError:
                             pass
             print(
-                f"Coletados e processados {len(documents)} documentos da tabela '{table_name}'."
+                f"Coletados e processados {collected} documentos da tabela '{table_name}'."
             )
         except Exception as e:
             print(f"Erro ao processar a tabela '{table_name}': {e}")
-        return documents
-
-    def index_data(self):
-        all_documents = []
-
-        all_documents.extend(
-            self._load_docs_from_json_column(table_name="tecelagem_e_revisao")
+            self.failed_sources.add(table_name)
+
+    def _source_readers(self):
+        """(tabela, função que gera os documentos dela), na ordem de indexação."""
+        for table_name in JSON_SOURCE_TABLES:
+            yield table_name, lambda t=table_name: self._iter_docs_from_json_column(table_name=t)
+        for table_name in PDF_SOURCE_TABLES:
+            yield table_name, lambda t=table_name: self._iter_docs_from_pdf_in_db(table_name=t)
+
+    def _split_document(self, doc: Document) -> list[Document]:
+        """Divide o documento e atribui a cada chunk um id determinístico."""
+        chunks = self.text_splitter.split_documents([doc])
+        for index, chunk in enumerate(chunks):
+            chunk.metadata["chunk_index"] = index
+            chunk.metadata["chunk_id"] = chunk_id(
+                doc.metadata["doc_key"], index, chunk.page_content
+            )
+        return chunks
+
+    def _delete_chunks(self, run, chunk_ids: list, doc_key: str):
+        """
+        Apaga chunks da coleção. Documentos que tinham duplicatas descartadas em
+        favor desses chunks são marcados para reprocessamento.
+        """
+        run.vector_store.delete(ids=chunk_ids)
+        run.lexical.delete(chunk_ids)
+        dependents = run.manifest.forget_chunks(chunk_ids, doc_key)
+        if dependents:
+            run.manifest.invalidate_documents(dependents)
+            run.invalidated |= dependents
+
+    def _commit_document(self, run, doc, doc_hash, doc_chunks, duplicates=()):
+        doc_key = doc.metadata["doc_key"]
+        new_ids = {chunk.metadata["chunk_id"] for chunk in doc_chunks}
+        stale_ids = [cid for cid in run.manifest.chunk_ids(doc_key) if cid not in new_ids]
+        if stale_ids:
+            self._delete_chunks(run, stale_ids, doc_key)
+
+        run.manifest.record_document(
+            doc_key,
+            doc.metadata["source_table"],
+            doc_hash,
+            [
+                (chunk.metadata["chunk_id"], content_hash(chunk.page_content))
+                for chunk in doc_chunks
+            ],
+            duplicates,
         )
-        all_documents.extend(self._load_docs_from_json_column(table_name="mantas"))
-        all_documents.extend(
-            self._load_docs_from_json_column(table_name="recepcao_de_materiais")
+
+    def _clear_index(self, run):
+        """
+        Limpa a coleção, o índice lexical e o manifesto para a reindexação
+        completa. Só é chamada quando a primeira tabela entrega dados: se o banco
+        estiver fora, o índice atual continua servindo as consultas.
+        """
+        print("Reindexação completa: limpando a coleção e o manifesto...")
+        run.vector_store.delete_collection()
+        run.vector_store = open_vector_store(
+            self.persist_directory, self.embeddings, self.vector_backend
         )
-        all_documents.extend(
-            self._load_docs_from_json_column(table_name="preparacao_de_fios")
+        run.lexical.clear()
+        # Por último: até aqui, uma queda faz a próxima execução limpar de novo.
+        run.manifest.clear(run.run_id)
+        run.known_hashes = {}
+        run.persisted = set()
+        run.clear_pending = False
+
+    def _iter_changed_chunks(self, run):
+        """
+        Gera os chunks dos documentos novos ou alterados, pulando as tabelas já
+        concluídas e os chunks já gravados pela execução retomada. Cada documento
+        fica em 'run.pending' até todos os seus chunks serem gravados.
+        """
+        completed = run.manifest.completed_sources(run.run_id)
+
+        for table_name, read_source in self._source_readers():
+            if table_name in completed:
+                print(f"Tabela '{table_name}' já concluída nesta execução; pulando.")
+                continue
+
+            source_keys = set()
+            for doc in read_source():
+                if run.clear_pending:
+                    self._clear_index(run)
+                run.read_docs += 1
+                doc_key = doc.metadata["doc_key"]
+                source_keys.add(doc_key)
+                doc_hash = document_hash(doc.page_content, doc.metadata)
+                if run.known_hashes.get(doc_key) == doc_hash:
+                    continue
+
+                run.changed_docs += 1
+                doc_chunks = self._split_document(doc)
+                duplicates = []
+                if run.deduplicator:
+                    doc_chunks, duplicates = run.deduplicator.filter(doc, doc_chunks)
+                remaining = [
+                    chunk
+                    for chunk in doc_chunks
+                    if chunk.metadata["chunk_id"] not in run.persisted
+                ]
+                if not remaining:
+                    self._commit_document(run, doc, doc_hash, doc_chunks, duplicates)
+                    continue
+
+                run.pending[doc_key] = [len(remaining), doc, doc_hash, doc_chunks, duplicates]
+                yield from remaining
+
+            if table_name in self.failed_sources:
+                print(f"  - Tabela '{table_name}' não foi lida; remoções dela ignoradas.")
+            else:
+                run.loaded_sources[table_name] = source_keys
+
+    def _complete_sources(self, run):
+        """
+        Fecha as tabelas lidas por inteiro cujos documentos já foram todos
+        gravados: remove os documentos apagados na origem e marca a tabela como
+        concluída no checkpoint.
+        """
+        busy = {entry[1].metadata["source_table"] for entry in run.pending.values()}
+
+        for table_name in [t for t in run.loaded_sources if t not in busy]:
+            source_keys = run.loaded_sources.pop(table_name)
+            for doc_key in run.manifest.doc_keys_by_source(table_name) - source_keys:
+                old_ids = run.manifest.chunk_ids(doc_key)
+                if old_ids:
+                    self._delete_chunks(run, old_ids, doc_key)
+                run.manifest.remove_document(doc_key)
+                run.removed_docs += 1
+            run.manifest.mark_source_completed(run.run_id, table_name)
+
+    def _write_embedded_batch(self, run, batch: list, embeddings: list):
+        """Grava o lote com os embeddings já calculados e registra o progresso."""
+        ids = [chunk.metadata["chunk_id"] for chunk in batch]
+        texts = [chunk.page_content for chunk in batch]
+        metadatas = [chunk.metadata for chunk in batch]
+        run.vector_store.upsert(
+            ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas
         )
-        all_documents.extend(
-            self._load_docs_from_json_column(table_name="pean_sean_felts_PSF")
+        run.lexical.upsert(ids, texts, metadatas)
+        run.manifest.record_persisted_chunks(run.run_id, ids)
+
+        for chunk in batch:
+            entry = run.pending[chunk.metadata["doc_key"]]
+            entry[0] -= 1
+            if entry[0] == 0:
+                _, doc, doc_hash, doc_chunks, duplicates = run.pending.pop(
+                    chunk.metadata["doc_key"]
+                )
+                self._commit_document(run, doc, doc_hash, doc_chunks, duplicates)
+
+        self._complete_sources(run)
+
+    def _backfill_lexical_index(self, run, page_size: int = 1000):
+        """Preenche o índice BM25 com os chunks de uma coleção criada antes dele."""
+        print("Construindo o índice lexical a partir da coleção existente...")
+        offset = 0
+        while True:
+            page = run.vector_store.get(
+                limit=page_size, offset=offset, include=["documents", "metadatas"]
+            )
+            if not page["ids"]:
+                break
+            run.lexical.upsert(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+        print(f"Índice lexical construído com {offset} fragmentos.")
+
+    def index_data(self, incremental: bool = False, resume: bool = True):
+        """
+        Indexa as tabelas de documentos. Com incremental=True, só os documentos
+        novos ou alterados desde a última execução são reembedados, e os apagados
+        na origem saem da coleção. Sem ele, a coleção é reconstruída do zero.
+
+        Os documentos são lidos, divididos e embedados em fluxo, em lotes de
+        batch_size chunks, então a memória não cresce com o tamanho do acervo.
+
+        O progresso fica salvo no manifesto: se a execução for interrompida, a
+        próxima (com resume=True) pula as tabelas concluídas e os chunks já
+        gravados, sem limpar de novo a coleção. A reindexação completa só limpa o
+        índice quando a primeira tabela entrega dados, e a limpeza só é marcada
+        como feita quando termina; se a execução cair antes, a retomada a refaz.
+        """
+        manifest = IndexManifest(self.persist_directory)
+        lexical = LexicalIndex(self.persist_directory)
+        vector_store = open_vector_store(
+            self.persist_directory, self.embeddings, self.vector_backend
         )
-        all_documents.extend(self._load_docs_from_json_column(table_name="metrologia"))
-        all_documents.extend(self._load_docs_from_json_column(table_name="expedicao"))
-        all_documents.extend(self._load_docs_from_json_column(table_name="acabamento"))
-        all_documents.extend(self._load_docs_from_pdf_in_db(table_name="DocumentosPDF"))
 
-        if not all_documents:
-            print("Nenhum dado encontrado para indexar. Indexação abortada.")
-            return
+        try:
+            if (
+                incremental
+                and isinstance(vector_store, PartitionedChroma)
+                and vector_store.needs_rebuild()
+            ):
+                print(
+                    "Índice em coleção única ou em partições de um esquema anterior: "
+                    "reindexando em partições por tabela..."
+                )
+                incremental = False
 
-        chunks = self.text_splitter.split_documents(all_documents)
-        print(f"Total de fragmentos gerados: {len(chunks)}")
+            mode = "incremental" if incremental else "full"
+            run_id, resumed = manifest.start_run(mode, resume=resume)
 
-        # Define o tamanho do lote (batch size). Um valor entre 200 e 500 é seguro.
-        batch_size = 300
-        total_chunks = len(chunks)
+            if resumed:
+                print(f"Retomando a execução {run_id}, interrompida anteriormente...")
+
+            self.failed_sources = set()
+            run = IndexRun(run_id, manifest, vector_store, lexical)
+            run.clear_pending = manifest.needs_clear(run_id)
+            if run.known_hashes and not run.clear_pending and not lexical.count():
+                self._backfill_lexical_index(run)
+            if self.dedup_threshold:
+                run.deduplicator = ChunkDeduplicator(manifest, threshold=self.dedup_threshold)
+            written = batches = 0
 
-        try:
             print(
-                f"Iniciando a indexação de {total_chunks} fragmentos em lotes de {batch_size}..."
+                f"Iniciando a indexação em lotes de até {self.batch_size} fragmentos "
+                f"({self.scheduler.max_batch_tokens} tokens)..."
             )
 
-            # Processa o primeiro lote para criar o banco de dados
-            if total_chunks > 0:
-                primeiro_lote = chunks[:batch_size]
-                vector_store = Chroma.from_documents(
-                    documents=primeiro_lote,
-                    embedding=self.embeddings,
-                    persist_directory=self.persist_directory,
+            # Os embeddings são calculados em paralelo; só esta thread grava no índice.
+            for batch, embeddings in self.scheduler.run(self._iter_changed_chunks(run)):
+                self._write_embedded_batch(run, batch, embeddings)
+                written += len(batch)
+                batches += 1
+                print(
+                    f"Lote {batches} processado ({written} fragmentos gravados, "
+                    f"concorrência {self.scheduler.concurrency:.1f})."
                 )
-                print(f"Lote 1/{total_chunks // batch_size + 1} processado.")
+            self._complete_sources(run)
 
-            # Processa os lotes restantes, adicionando ao banco de dados existente
-            for i in range(batch_size, total_chunks, batch_size):
-                lote_atual = chunks[i : i + batch_size]
-                vector_store.add_documents(documents=lote_atual)
+            if run.clear_pending:
+                # Nada foi lido, então a coleção não foi tocada.
+                if self.failed_sources:
+                    print(
+                        f"Nenhuma tabela pôde ser lida ({sorted(self.failed_sources)}). "
+                        "Indexação abortada; o índice atual foi mantido."
+                    )
+                else:
+                    print(
+                        "Nenhum dado encontrado para indexar. "
+                        "Indexação abortada; o índice atual foi mantido."
+                    )
+                    manifest.finish_run(run_id)
+                return
+
+            # Os leitores do índice mapeado só veem a nova versão depois deste ponto.
+            vector_store = run.vector_store
+            if isinstance(vector_store, MmapVectorStore) and (
+                vector_store.modified or not vector_store.is_built()
+            ):
+                vector_store.build()
+
+            if self.failed_sources:
                 print(
-                    f"Lote {i // batch_size + 1}/{total_chunks // batch_size + 1} processado."
+                    f"Tabelas com falha: {sorted(self.failed_sources)}. "
+                    "Execute novamente para concluí-las."
                 )
+            else:
+                manifest.finish_run(run_id)
 
+            print(
+                f"{run.read_docs} documentos lidos: {run.changed_docs} novos ou alterados, "
+                f"{run.removed_docs} removidos, {written} fragmentos gravados."
+            )
+            if run.deduplicator:
+                run.deduplicator.print_report()
+            if run.invalidated:
+                print(
+                    f"{len(run.invalidated)} documentos tinham duplicatas de fragmentos "
+                    "removidos e serão reprocessados na próxima execução."
+                )
             print("Indexação concluída. Dados armazenados com sucesso!")
 
         except Exception as e:
             print(f"Erro durante a indexação ou persistência no ChromaDB: {e}")
+            print("O progresso foi salvo; execute novamente para retomar.")
+        finally:
+            manifest.close()
+            lexical.close()
+
+
+class IndexRun:
+    """Estado de uma execução de index_data: checkpoint, contadores e documentos pendentes."""
+
+    def __init__(self, run_id: int, manifest: IndexManifest, vector_store, lexical: LexicalIndex):
+        self.run_id = run_id
+        self.manifest = manifest
+        self.vector_store = vector_store
+        self.lexical = lexical
+        self.known_hashes = manifest.document_hashes()
+        # Chunks gravados antes da interrupção não são embedados nem gravados de novo.
+        self.persisted = manifest.persisted_chunk_ids(run_id)
+        # doc_key -> [chunks ainda não gravados, doc, hash, chunks, duplicatas]
+        self.pending = {}
+        # Tabelas lidas por inteiro e ainda não concluídas -> doc_keys vistos.
+        self.loaded_sources = {}
+        self.deduplicator = None
+        # Reindexação completa que ainda não limpou o índice (ver _clear_index).
+        self.clear_pending = False
+        self.invalidated = set()
+        self.read_docs = self.changed_docs = self.removed_docs = 0
 
 
 if __name__ == "__main__":
@@ -267,5 +543,7 @@ if __name__ == "__main__":
         "pwd": os.getenv("DB_PASSWORD"),
     }
 
-    indexer = RAGIndexer(persist_directory="./rag_db_index", db_config=sql_config)
-    indexer.index_data()
+    indexer = RAGIndexer(persist_directory=RAG_INDEX_PATH, db_config=sql_config)
+    indexer.index_data(
+        incremental="--full" not in sys.argv, resume="--restart" not in sys.argv
+    )
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+
+from langchain_core.documents import Document
+
+"""
+Índice lexical (BM25) dos mesmos chunks do Chroma, em SQLite FTS5. Resolve em
+milissegundos, sem chamada de embedding, as buscas por códigos, números de peça
+e identificadores de máquina, que os embeddings densos tratam mal.
+"""
+
+LEXICAL_INDEX_FILE_NAME = "lexical_index.sqlite3"
+# Constante k da Reciprocal Rank Fusion.
+RRF_K = 60
+
+_TERM_RE = re.compile(r"[\w\-]+")
+_FIELD_RE = re.compile(r"^\w+$")
+_STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "de", "da", "do", "das", "dos", "e", "em",
+    "no", "na", "nos", "nas", "para", "por", "com", "sem", "que", "qual", "quais",
+    "como", "onde", "quando", "sobre", "ao", "aos", "se", "ou", "é", "são", "me",
+    "the", "of", "and", "to", "in", "for", "is",
+}
+
+
+def query_terms(query: str) -> list:
+    terms = [term.strip("-").lower() for term in _TERM_RE.findall(query)]
+    return [term for term in terms if term and term not in _STOPWORDS]
+
+
+def is_identifier(term: str) -> bool:
+    """Códigos como 'M-102', 'OS4471', '4471-A': têm dígitos ou separadores internos."""
+    return any(c.isdigit() for c in term) or ("-" in term or "_" in term)
+
+
+def is_identifier_query(query: str, min_ratio: float = 0.5) -> bool:
+    terms = query_terms(query)
+    if not terms:
+        return False
+    return sum(1 for term in terms if is_identifier(term)) / len(terms) >= min_ratio
+
+
+def is_equality_filter(source_filter: dict) -> bool:
+    """
+    Filtro só com igualdades campo -> valor, o único que o índice lexical
+    entende. Operadores do Chroma ($and, $in, ...) ficam só na busca vetorial.
+    """
+    return all(
+        isinstance(field, str)
+        and _FIELD_RE.match(field)
+        and isinstance(value, (str, int, float, bool))
+        for field, value in (source_filter or {}).items()
+    )
+
+
+def reciprocal_rank_fusion(result_lists: list, k: int, key=None) -> list:
+    """Funde listas de Documents ranqueadas: score = soma de 1 / (RRF_K + posição)."""
+    key = key or (lambda doc: doc.metadata.get("chunk_id") or doc.page_content)
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            doc_id = key(doc)
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (RRF_K + rank + 1)
+            docs.setdefault(doc_id, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[doc_id] for doc_id in ranked[:k]]
+
+
+class LexicalIndex:
+    def __init__(self, persist_directory: str):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, LEXICAL_INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL: o retriever continua lendo enquanto o indexador grava.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                chunk_id TEXT UNIQUE NOT NULL,
+                metadata TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                content,
+                content='chunks',
+                content_rowid='id',
+                tokenize="unicode61 remove_diacritics 2 tokenchars '-_'"
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, content)
+                VALUES ('delete', old.id, old.content);
+            END;
+            """
+        )
+        self.conn.commit()
+
+    @classmethod
+    def open_existing(cls, persist_directory: str):
+        """Abre o índice se ele já foi construído; senão, None."""
+        if not os.path.exists(os.path.join(persist_directory, LEXICAL_INDEX_FILE_NAME)):
+            return None
+        return cls(persist_directory)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, ids: list, texts: list, metadatas: list):
+        rows = [
+            (cid, json.dumps(metadata, ensure_ascii=False, default=str), text)
+            for cid, text, metadata in zip(ids, texts, metadatas)
+        ]
+        with self._lock, self.conn:
+            self._delete(ids)
+            self.conn.executemany(
+                "INSERT INTO chunks (chunk_id, metadata, content) VALUES (?, ?, ?)", rows
+            )
+
+    def delete(self, ids: list):
+        with self._lock, self.conn:
+            self._delete(ids)
+
+    def _delete(self, ids: list):
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self.conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", chunk)
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chunks")
+
+    def search(
+        self,
+        query: str,
+        k: int = 4,
+        source_filter: dict = None,
+        require_identifiers: bool = False,
+    ) -> list:
+        """
+        Documents ordenados por BM25. Os termos são combinados com OR; com
+        require_identifiers, só voltam os chunks que contêm todos os
+        identificadores da query (ex.: "M-102").
+        """
+        if not is_equality_filter(source_filter):
+            raise ValueError(f"Filtro não suportado pelo índice lexical: {source_filter}")
+
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        def quote(term):
+            return '"' + term.replace('"', '""') + '"'
+
+        match = " OR ".join(quote(term) for term in terms)
+        if require_identifiers:
+            identifiers = [term for term in terms if is_identifier(term)]
+            if not identifiers:
+                return []
+            match = " AND ".join([f"({match})"] + [quote(term) for term in identifiers])
+        sql = (
+            "SELECT c.chunk_id, c.metadata, c.content FROM chunks_fts "
+            "JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        )
+        params = [match]
+        for field, value in (source_filter or {}).items():
+            sql += " AND json_extract(c.metadata, ?) = ?"
+            params += [f"$.{field}", value]
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(k)
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            Document(page_content=content, metadata=json.loads(metadata))
+            for _, metadata, content in rows
+        ]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,371 @@
+import os
+import sqlite3
+import hashlib
+import json
+from array import array
+from datetime import datetime, timezone
+
+"""
+Manifesto da indexação incremental: guarda o hash de cada documento indexado
+e os ids dos chunks que ele gerou, para que a próxima execução reembede apenas
+o que mudou e remova da coleção o que foi apagado na origem.
+
+Também guarda o checkpoint da execução em andamento (tabelas já concluídas e
+chunks já gravados), para que uma execução interrompida seja retomada do ponto
+em que parou.
+"""
+
+MANIFEST_FILE_NAME = "index_manifest.sqlite3"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_hash(page_content: str, metadata: dict) -> str:
+    return content_hash(
+        page_content + json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    )
+
+
+def chunk_id(doc_key: str, index: int, text: str) -> str:
+    """Id determinístico: o mesmo chunk gera sempre o mesmo id, o que torna o upsert idempotente."""
+    return f"{doc_key}:{index}:{content_hash(text)[:16]}"
+
+
+class IndexManifest:
+    def __init__(self, persist_directory: str):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, MANIFEST_FILE_NAME)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_key TEXT PRIMARY KEY,
+                source_table TEXT NOT NULL,
+                doc_hash TEXT NOT NULL,
+                indexed_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                doc_key TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunks_doc_key ON chunks (doc_key);
+            CREATE INDEX IF NOT EXISTS ix_documents_source ON documents (source_table);
+            CREATE TABLE IF NOT EXISTS index_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mode TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                cleared_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS run_sources (
+                run_id INTEGER NOT NULL,
+                source_table TEXT NOT NULL,
+                completed_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, source_table)
+            );
+            CREATE TABLE IF NOT EXISTS chunk_signatures (
+                chunk_id TEXT PRIMARY KEY,
+                doc_key TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                signature BLOB,
+                scope TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_signatures_hash ON chunk_signatures (chunk_hash);
+            CREATE INDEX IF NOT EXISTS ix_signatures_doc_key ON chunk_signatures (doc_key);
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                bucket TEXT NOT NULL,
+                chunk_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_lsh_bucket ON lsh_buckets (bucket);
+            CREATE INDEX IF NOT EXISTS ix_lsh_chunk ON lsh_buckets (chunk_id);
+            CREATE TABLE IF NOT EXISTS duplicates (
+                chunk_id TEXT PRIMARY KEY,
+                doc_key TEXT NOT NULL,
+                source_table TEXT,
+                file_name TEXT,
+                kept_chunk_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                similarity REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_duplicates_kept ON duplicates (kept_chunk_id);
+            CREATE INDEX IF NOT EXISTS ix_duplicates_doc_key ON duplicates (doc_key);
+            CREATE TABLE IF NOT EXISTS run_chunks (
+                run_id INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (run_id, chunk_id)
+            );
+            """
+        )
+        # Manifestos criados antes do checkpoint de limpeza.
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(index_runs)")}
+        if "cleared_at" not in columns:
+            self.conn.execute("ALTER TABLE index_runs ADD COLUMN cleared_at TEXT")
+        # Manifestos de quando a deduplicação cruzava arquivos e tabelas: os
+        # documentos que perderam chunks para outra origem são reprocessados.
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(chunk_signatures)")}
+        if "scope" not in columns:
+            self.conn.execute("ALTER TABLE chunk_signatures ADD COLUMN scope TEXT")
+            self.conn.execute(
+                "UPDATE documents SET doc_hash = '' WHERE doc_key IN (SELECT doc_key FROM duplicates)"
+            )
+        self.conn.commit()
+
+    def document_hashes(self) -> dict:
+        return dict(self.conn.execute("SELECT doc_key, doc_hash FROM documents"))
+
+    def doc_keys_by_source(self, source_table: str) -> set:
+        return {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT doc_key FROM documents WHERE source_table = ?", (source_table,)
+            )
+        }
+
+    def chunk_ids(self, doc_key: str) -> list:
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT chunk_id FROM chunks WHERE doc_key = ?", (doc_key,)
+            )
+        ]
+
+    def record_document(
+        self,
+        doc_key: str,
+        source_table: str,
+        doc_hash: str,
+        chunks: list,
+        duplicates: list = (),
+    ):
+        """
+        Registra o documento, seus chunks [(chunk_id, chunk_hash)] e as duplicatas
+        descartadas dele, substituindo os registros anteriores.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE doc_key = ?", (doc_key,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, doc_key, chunk_hash) VALUES (?, ?, ?)",
+                [(cid, doc_key, chash) for cid, chash in chunks],
+            )
+            self.conn.execute("DELETE FROM duplicates WHERE doc_key = ?", (doc_key,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO duplicates (chunk_id, doc_key, source_table, "
+                "file_name, kept_chunk_id, kind, similarity) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                duplicates,
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_key, source_table, doc_hash, indexed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (doc_key, source_table, doc_hash, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def remove_document(self, doc_key: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE doc_key = ?", (doc_key,))
+            self.conn.execute("DELETE FROM duplicates WHERE doc_key = ?", (doc_key,))
+            self.conn.execute("DELETE FROM documents WHERE doc_key = ?", (doc_key,))
+
+    def clear(self, run_id: int = None):
+        """
+        Apaga documentos, chunks e assinaturas. Com run_id, marca na mesma
+        transação que a execução completa já limpou o índice (ver needs_clear).
+        """
+        with self.conn:
+            for table in ("chunks", "documents", "chunk_signatures", "lsh_buckets", "duplicates"):
+                self.conn.execute(f"DELETE FROM {table}")
+            if run_id is not None:
+                self.conn.execute("DELETE FROM run_chunks WHERE run_id = ?", (run_id,))
+                self.conn.execute(
+                    "UPDATE index_runs SET cleared_at = ? WHERE run_id = ?",
+                    (datetime.now(timezone.utc).isoformat(), run_id),
+                )
+
+    # Assinaturas para a deduplicação. As escritas entram na transação corrente
+    # e são confirmadas junto com o próximo documento registrado.
+
+    def exact_candidates(self, chunk_hash: str, scope: str) -> list:
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT chunk_id FROM chunk_signatures WHERE chunk_hash = ? AND scope = ?",
+                (chunk_hash, scope),
+            )
+        ]
+
+    def lsh_candidates(self, buckets: list, scope: str) -> list:
+        """[(chunk_id, assinatura)] dos chunks do escopo que caem em algum dos buckets."""
+        placeholders = ",".join("?" * len(buckets))
+        rows = self.conn.execute(
+            "SELECT s.chunk_id, s.signature FROM chunk_signatures s WHERE s.scope = ? "
+            f"AND s.chunk_id IN (SELECT chunk_id FROM lsh_buckets WHERE bucket IN ({placeholders}))",
+            [scope] + list(buckets),
+        )
+        return [
+            (cid, array("Q", signature).tolist()) for cid, signature in rows if signature
+        ]
+
+    def add_signature(
+        self,
+        chunk_id: str,
+        doc_key: str,
+        chunk_hash: str,
+        signature: list,
+        buckets: list,
+        scope: str,
+    ):
+        self.conn.execute("DELETE FROM lsh_buckets WHERE chunk_id = ?", (chunk_id,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO chunk_signatures "
+            "(chunk_id, doc_key, chunk_hash, signature, scope) VALUES (?, ?, ?, ?, ?)",
+            (chunk_id, doc_key, chunk_hash, array("Q", signature).tobytes(), scope),
+        )
+        self.conn.executemany(
+            "INSERT INTO lsh_buckets (bucket, chunk_id) VALUES (?, ?)",
+            [(bucket, chunk_id) for bucket in buckets],
+        )
+
+    def forget_signatures(self, doc_key: str, keep: set = frozenset()):
+        """Remove as assinaturas dos chunks do documento que não estão em 'keep'."""
+        stale = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT chunk_id FROM chunk_signatures WHERE doc_key = ?", (doc_key,)
+            )
+            if row[0] not in keep
+        ]
+        self._delete_signatures(stale)
+
+    def forget_chunks(self, chunk_ids: list, doc_key: str = None) -> set:
+        """
+        Esquece chunks apagados da coleção e retorna os documentos (fora doc_key)
+        que tinham duplicatas apontando para eles.
+        """
+        self._delete_signatures(chunk_ids)
+        dependents = set()
+        for i in range(0, len(chunk_ids), 500):
+            chunk = chunk_ids[i : i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            dependents.update(
+                row[0]
+                for row in self.conn.execute(
+                    f"SELECT doc_key FROM duplicates WHERE kept_chunk_id IN ({placeholders})",
+                    chunk,
+                )
+            )
+        dependents.discard(doc_key)
+        return dependents
+
+    def duplicates_of(self, kept_chunk_id: str) -> list:
+        """Origem dos fragmentos descartados como duplicatas de kept_chunk_id."""
+        return self.conn.execute(
+            "SELECT doc_key, source_table, file_name, kind, similarity FROM duplicates "
+            "WHERE kept_chunk_id = ?",
+            (kept_chunk_id,),
+        ).fetchall()
+
+    def invalidate_documents(self, doc_keys: set):
+        """Força o reprocessamento dos documentos na próxima execução."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE documents SET doc_hash = '' WHERE doc_key = ?",
+                [(doc_key,) for doc_key in doc_keys],
+            )
+
+    def _delete_signatures(self, chunk_ids: list):
+        for i in range(0, len(chunk_ids), 500):
+            chunk = chunk_ids[i : i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self.conn.execute(
+                f"DELETE FROM chunk_signatures WHERE chunk_id IN ({placeholders})", chunk
+            )
+            self.conn.execute(
+                f"DELETE FROM lsh_buckets WHERE chunk_id IN ({placeholders})", chunk
+            )
+
+    def start_run(self, mode: str, resume: bool = True) -> tuple:
+        """
+        Abre uma execução e retorna (run_id, retomada). Uma execução interrompida
+        é retomada se for do mesmo modo, ou se a nova for incremental; caso
+        contrário, é abandonada.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        row = self.conn.execute(
+            "SELECT run_id, mode FROM index_runs WHERE finished_at IS NULL "
+            "ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+        if resume and row and (row[1] == mode or mode == "incremental"):
+            return row[0], True
+
+        with self.conn:
+            if row:
+                self._discard_run_chunks()
+                self.conn.execute(
+                    "UPDATE index_runs SET finished_at = ? WHERE finished_at IS NULL", (now,)
+                )
+            cursor = self.conn.execute(
+                "INSERT INTO index_runs (mode, started_at) VALUES (?, ?)", (mode, now)
+            )
+        return cursor.lastrowid, False
+
+    def needs_clear(self, run_id: int) -> bool:
+        """
+        Execução completa que ainda não limpou a coleção e o manifesto. Vale também
+        para uma execução retomada: se a anterior caiu antes de concluir a
+        limpeza, ela é refeita, senão os hashes antigos fariam tudo parecer
+        inalterado.
+        """
+        row = self.conn.execute(
+            "SELECT mode, cleared_at FROM index_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        return row is not None and row[0] == "full" and row[1] is None
+
+    def completed_sources(self, run_id: int) -> set:
+        return {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT source_table FROM run_sources WHERE run_id = ?", (run_id,)
+            )
+        }
+
+    def mark_source_completed(self, run_id: int, source_table: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run_sources (run_id, source_table, completed_at) "
+                "VALUES (?, ?, ?)",
+                (run_id, source_table, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def persisted_chunk_ids(self, run_id: int) -> set:
+        return {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT chunk_id FROM run_chunks WHERE run_id = ?", (run_id,)
+            )
+        }
+
+    def record_persisted_chunks(self, run_id: int, chunk_ids: list):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO run_chunks (run_id, chunk_id) VALUES (?, ?)",
+                [(run_id, cid) for cid in chunk_ids],
+            )
+
+    def finish_run(self, run_id: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM run_chunks WHERE run_id = ?", (run_id,))
+            self.conn.execute(
+                "UPDATE index_runs SET finished_at = ? WHERE run_id = ?",
+                (datetime.now(timezone.utc).isoformat(), run_id),
+            )
+
+    def _discard_run_chunks(self):
+        self.conn.execute(
+            "DELETE FROM run_chunks WHERE run_id IN "
+            "(SELECT run_id FROM index_runs WHERE finished_at IS NULL)"
+        )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,481 @@
+import os
+import re
+import json
+import glob
+import sqlite3
+import threading
+from collections import namedtuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+RAG_MMAP_DTYPE = os.getenv("RAG_MMAP_DTYPE", "int8")
+RAG_MMAP_RESCORE = os.getenv("RAG_MMAP_RESCORE", "true").lower() == "true"
+# Candidatos reavaliados em float32 por resultado pedido.
+RAG_MMAP_RESCORE_FACTOR = int(os.getenv("RAG_MMAP_RESCORE_FACTOR", "8"))
+
+MMAP_DIRECTORY_NAME = "mmap_index"
+STORE_FILE_NAME = "vectors.sqlite3"
+LAYOUT_FILE_NAME = "layout.json"
+# Linhas da matriz processadas por vez na busca, para limitar a memória temporária.
+SEARCH_BLOCK_ROWS = 65536
+
+_FIELD_RE = re.compile(r"^\w+$")
+# Operadores de comparação do filtro do Chroma e o equivalente em SQL.
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+"""
+Vector store local em matrizes NumPy mapeadas em memória. Os embeddings ficam
+quantizados (int8 com escala por linha, ou float16) e normalizados, de modo que
+o produto interno é a similaridade de cosseno. Com o rescore, os melhores
+candidatos são reavaliados no float32 original.
+
+O indexador grava em uma tabela SQLite (durável, com upsert e delete baratos) e,
+ao final da execução, build() gera uma nova versão das matrizes e troca o
+layout.json de forma atômica. Os processos leitores abrem as matrizes com
+mmap_mode="r": todos compartilham o mesmo page cache, e uma indexação
+interrompida nunca fica visível pela metade.
+"""
+
+
+# Uma versão publicada das matrizes. É trocada por inteiro em uma única
+# atribuição, e cada busca usa a mesma referência do início ao fim.
+MatrixSnapshot = namedtuple(
+    "MatrixSnapshot", ["layout_mtime", "matrix", "full", "scales", "ids", "partitions"]
+)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def filter_to_sql(source_filter: dict) -> tuple:
+    """
+    Traduz um filtro no formato do Chroma ({campo: valor}, $eq, $ne, $gt, $gte,
+    $lt, $lte, $in, $nin, $and, $or) para (condição SQL, parâmetros) sobre a
+    tabela vectors. Operadores desconhecidos levantam ValueError.
+    """
+    clauses, params = [], []
+    for field, condition in source_filter.items():
+        if field in ("$and", "$or"):
+            if not isinstance(condition, (list, tuple)) or not condition:
+                raise ValueError(f"Filtro não suportado: {field} espera uma lista não vazia.")
+            parts = [filter_to_sql(sub_filter) for sub_filter in condition]
+            joiner = " AND " if field == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, sub_params in parts:
+                params += sub_params
+            continue
+
+        if not isinstance(field, str) or not _FIELD_RE.match(field):
+            raise ValueError(f"Filtro não suportado: campo {field!r}.")
+        if field in ("source_table", "file_name"):
+            column = field
+        else:
+            column = "json_extract(metadata, ?)"
+        column_params = [] if column == field else [f"$.{field}"]
+
+        operators = condition if isinstance(condition, dict) else {"$eq": condition}
+        for operator, value in operators.items():
+            if operator in ("$in", "$nin"):
+                if not isinstance(value, (list, tuple)):
+                    raise ValueError(f"Filtro não suportado: {operator} espera uma lista.")
+                if not value:
+                    clauses.append("1 = 0" if operator == "$in" else "1 = 1")
+                    continue
+                negation = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{column} {negation}IN ({','.join('?' * len(value))})")
+                params += column_params + list(value)
+            elif operator in _SQL_OPERATORS:
+                clauses.append(f"{column} {_SQL_OPERATORS[operator]} ?")
+                params += column_params + [value]
+            else:
+                raise ValueError(f"Filtro não suportado: operador {operator!r}.")
+
+    return " AND ".join(clauses) or "1 = 1", params
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple:
+    """Retorna (matriz quantizada, escala por linha ou None) de vetores normalizados."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1)
+        scales[scales == 0] = 1.0
+        quantized = np.round(vectors / scales[:, None] * 127).astype(np.int8)
+        return quantized, (scales / 127).astype(np.float32)
+    raise ValueError(f"Tipo de quantização não suportado: {dtype}")
+
+
+class MmapVectorStore:
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Embeddings = None,
+        dtype: str = RAG_MMAP_DTYPE,
+        rescore: bool = RAG_MMAP_RESCORE,
+    ):
+        self.directory = os.path.join(persist_directory, MMAP_DIRECTORY_NAME)
+        os.makedirs(self.directory, exist_ok=True)
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.rescore = rescore
+        self.modified = False
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            os.path.join(self.directory, STORE_FILE_NAME), check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                chunk_id TEXT PRIMARY KEY,
+                source_table TEXT,
+                file_name TEXT,
+                metadata TEXT NOT NULL,
+                content TEXT NOT NULL,
+                embedding BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_vectors_partition ON vectors (source_table, chunk_id);
+            CREATE INDEX IF NOT EXISTS ix_vectors_file_name ON vectors (file_name);
+            """
+        )
+        self.conn.commit()
+
+        self._snapshot = None
+
+    # Escrita (indexador)
+
+    def upsert(self, ids: list, embeddings: list, documents: list, metadatas: list):
+        rows = [
+            (
+                cid,
+                metadata.get("source_table"),
+                metadata.get("file_name"),
+                json.dumps(metadata, ensure_ascii=False, default=str),
+                text,
+                np.asarray(embedding, dtype=np.float32).tobytes(),
+            )
+            for cid, embedding, text, metadata in zip(ids, embeddings, documents, metadatas)
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors "
+                "(chunk_id, source_table, file_name, metadata, content, embedding) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self.modified = True
+
+    def delete(self, ids: list = None):
+        ids = list(ids or [])
+        with self._lock, self.conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self.conn.execute(
+                    f"DELETE FROM vectors WHERE chunk_id IN ({placeholders})", chunk
+                )
+        self.modified = True
+
+    def delete_collection(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM vectors")
+        self.modified = True
+
+    def get(self, limit: int = None, offset: int = 0, include: list = None) -> dict:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT chunk_id, content, metadata FROM vectors ORDER BY chunk_id "
+                "LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return {
+            "ids": [row[0] for row in rows],
+            "documents": [row[1] for row in rows],
+            "metadatas": [json.loads(row[2]) for row in rows],
+        }
+
+    def is_built(self) -> bool:
+        layout = self._read_layout()
+        return bool(layout) and "partitions" in layout
+
+    def build(self):
+        """Gera uma nova versão das matrizes a partir da tabela e a publica."""
+        with self._lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            first = self.conn.execute("SELECT embedding FROM vectors LIMIT 1").fetchone()
+        dimensions = len(first[0]) // 4 if first else 0
+
+        version = self._current_version() + 1
+        paths = {
+            name: os.path.join(self.directory, f"{name}.v{version}.npy")
+            for name in ("quantized", "scales", "full", "ids")
+        }
+
+        quantized = np.lib.format.open_memmap(
+            paths["quantized"],
+            mode="w+",
+            dtype=np.float16 if self.dtype == "float16" else np.int8,
+            shape=(count, dimensions),
+        )
+        scales = np.ones(count, dtype=np.float32)
+        full = np.lib.format.open_memmap(
+            paths["full"], mode="w+", dtype=np.float32, shape=(count, dimensions)
+        )
+        ids = []
+        partitions = {}
+
+        # Ordenado por tabela: cada partição ocupa um intervalo contínuo de linhas,
+        # e dentro dela os ids ficam ordenados (busca binária no filtro).
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT chunk_id, embedding, source_table FROM vectors "
+                "ORDER BY source_table, chunk_id"
+            )
+            position = 0
+            while True:
+                rows = cursor.fetchmany(SEARCH_BLOCK_ROWS)
+                if not rows:
+                    break
+                block = _normalize(
+                    np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+                    .reshape(len(rows), dimensions)
+                )
+                block_quantized, block_scales = quantize(block, self.dtype)
+                end = position + len(rows)
+                full[position:end] = block
+                quantized[position:end] = block_quantized
+                if block_scales is not None:
+                    scales[position:end] = block_scales
+                for offset, row in enumerate(rows):
+                    ids.append(row[0])
+                    bounds = partitions.setdefault(row[2] or "", [position + offset, 0])
+                    bounds[1] = position + offset + 1
+                position = end
+
+        quantized.flush()
+        full.flush()
+        del quantized, full
+        np.save(paths["scales"], scales)
+        np.save(paths["ids"], np.array(ids, dtype=str))
+
+        layout = {
+            "version": version,
+            "count": count,
+            "dimensions": dimensions,
+            "dtype": self.dtype,
+            "partitions": partitions,
+            "files": {name: os.path.basename(path) for name, path in paths.items()},
+        }
+        layout_path = os.path.join(self.directory, LAYOUT_FILE_NAME)
+        with open(layout_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(layout, f)
+        os.replace(layout_path + ".tmp", layout_path)
+        self.modified = False
+
+        self._remove_old_versions(keep={version, version - 1})
+        print(
+            f"Índice mapeado em memória publicado: versão {version}, "
+            f"{count} vetores ({self.dtype})."
+        )
+
+    def _current_version(self) -> int:
+        layout = self._read_layout()
+        return layout["version"] if layout else 0
+
+    def _read_layout(self):
+        try:
+            with open(os.path.join(self.directory, LAYOUT_FILE_NAME), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _remove_old_versions(self, keep: set):
+        # A versão anterior fica para os leitores que ainda não recarregaram.
+        for path in glob.glob(os.path.join(self.directory, "*.v*.npy")):
+            version = path.rsplit(".v", 1)[1].split(".")[0]
+            if version.isdigit() and int(version) not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # Leitura (retriever)
+
+    def _load(self):
+        """Snapshot atual das matrizes, reaberto se uma nova versão foi publicada; None se não há."""
+        layout_path = os.path.join(self.directory, LAYOUT_FILE_NAME)
+        try:
+            mtime = os.stat(layout_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.layout_mtime == mtime:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.layout_mtime != mtime:
+                layout = self._read_layout()
+                files = {
+                    name: os.path.join(self.directory, file_name)
+                    for name, file_name in layout["files"].items()
+                }
+                snapshot = MatrixSnapshot(
+                    layout_mtime=mtime,
+                    matrix=np.load(files["quantized"], mmap_mode="r"),
+                    full=np.load(files["full"], mmap_mode="r"),
+                    scales=np.load(files["scales"]) if layout["dtype"] == "int8" else None,
+                    ids=np.load(files["ids"]),
+                    partitions=layout.get("partitions"),
+                )
+                self._snapshot = snapshot
+        return snapshot
+
+    def _candidate_rows(self, snapshot: MatrixSnapshot, source_filter: dict):
+        """
+        Linhas que atendem ao filtro: um slice da partição quando o filtro é só
+        um valor de source_table, ou os índices das linhas dos chunks encontrados
+        pelo índice de metadados (demais filtros, ver filter_to_sql). None = todas.
+        """
+        if not source_filter:
+            return None
+
+        source_table = source_filter.get("source_table")
+        if (
+            set(source_filter) == {"source_table"}
+            and not isinstance(source_table, dict)
+            and snapshot.partitions is not None
+        ):
+            start, end = snapshot.partitions.get(str(source_table), (0, 0))
+            return slice(start, end)
+
+        where, params = filter_to_sql(source_filter)
+        groups = {}
+        with self._lock:
+            for source_table, cid in self.conn.execute(
+                f"SELECT source_table, chunk_id FROM vectors WHERE {where}", params
+            ):
+                groups.setdefault(source_table or "", []).append(cid)
+
+        if snapshot.partitions is None:
+            allowed = [cid for cids in groups.values() for cid in cids]
+            return np.flatnonzero(np.isin(snapshot.ids, allowed))
+
+        rows = []
+        for source_table, cids in groups.items():
+            start, end = snapshot.partitions.get(source_table, (0, 0))
+            cids = np.array(sorted(cids), dtype=snapshot.ids.dtype)
+            positions = np.searchsorted(snapshot.ids[start:end], cids)
+            # Chunks gravados depois do último build ainda não estão nas matrizes.
+            found = positions < end - start
+            found[found] = snapshot.ids[start + positions[found]] == cids[found]
+            rows.append(start + positions[found])
+        return np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+
+    def _blocks(self, snapshot: MatrixSnapshot, rows):
+        """(índices, bloco da matriz, escalas) em blocos de SEARCH_BLOCK_ROWS linhas."""
+        matrix, scales_all = snapshot.matrix, snapshot.scales
+        if rows is None:
+            rows = slice(0, matrix.shape[0])
+
+        if isinstance(rows, slice):
+            for start in range(rows.start, rows.stop, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, rows.stop)
+                scales = None if scales_all is None else scales_all[start:end]
+                yield np.arange(start, end), matrix[start:end], scales
+        else:
+            for i in range(0, len(rows), SEARCH_BLOCK_ROWS):
+                block_rows = rows[i : i + SEARCH_BLOCK_ROWS]
+                scales = None if scales_all is None else scales_all[block_rows]
+                yield block_rows, matrix[block_rows], scales
+
+    def _top_k(self, snapshot: MatrixSnapshot, queries: np.ndarray, k: int, rows) -> tuple:
+        """Top-k por consulta (índices de linha e scores), varrendo só as linhas candidatas."""
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        for block_rows, block, scales in self._blocks(snapshot, rows):
+            scores = queries @ block.astype(np.float32).T
+            if scales is not None:
+                scores *= scales
+
+            best_rows = np.concatenate(
+                [best_rows, np.broadcast_to(block_rows, scores.shape)], axis=1
+            )
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return (
+            np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+    def search_by_vectors(self, vectors: list, k: int = 4, source_filter: dict = None) -> list:
+        """Busca em lote: para cada vetor, [(chunk_id, score)] em ordem decrescente."""
+        snapshot = self._load()
+        if snapshot is None or not len(snapshot.ids):
+            return [[] for _ in vectors]
+
+        queries = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+        candidate_rows = self._candidate_rows(snapshot, source_filter)
+        candidates = k * RAG_MMAP_RESCORE_FACTOR if self.rescore else k
+        rows, scores = self._top_k(snapshot, queries, candidates, candidate_rows)
+
+        results = []
+        for query, query_rows, query_scores in zip(queries, rows, scores):
+            if self.rescore and len(query_rows):
+                # Linhas em ordem crescente: leitura mais sequencial do mmap.
+                query_rows = np.sort(query_rows)
+                exact = snapshot.full[query_rows] @ query
+                order = np.argsort(-exact)[:k]
+                query_rows, query_scores = query_rows[order], exact[order]
+            results.append(
+                [
+                    (str(snapshot.ids[row]), float(score))
+                    for row, score in zip(query_rows[:k], query_scores[:k])
+                ]
+            )
+        return results
+
+    def _documents(self, hits: list) -> list:
+        ids = [cid for cid, _ in hits]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = {
+                row[0]: row[1:]
+                for row in self.conn.execute(
+                    f"SELECT chunk_id, content, metadata FROM vectors WHERE chunk_id IN ({placeholders})",
+                    ids,
+                )
+            }
+        return [
+            Document(page_content=rows[cid][0], metadata=json.loads(rows[cid][1]))
+            for cid in ids
+            if cid in rows
+        ]
+
+    def similarity_search_by_vector(self, embedding: list, k: int = 4, filter: dict = None) -> list:
+        return self._documents(self.search_by_vectors([embedding], k, filter)[0])
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None) -> list:
+        return self.similarity_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, filter=filter
+        )
+
+    def close(self):
+        self.conn.close()
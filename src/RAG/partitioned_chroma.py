@@ -0,0 +1,316 @@
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+
+import chromadb
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+
+"""
+Índice Chroma particionado por source_table: uma coleção por tabela de origem,
+mais um índice de metadados (file_name -> chunk_ids) em SQLite. Uma busca com
+source_filter consulta apenas a partição relevante, em vez de filtrar uma
+coleção que mistura todas as origens, e continua rápida conforme o acervo cresce.
+"""
+
+PARTITION_PREFIX = "rag_"
+LEGACY_COLLECTION_NAME = "langchain"
+FILE_INDEX_FILE_NAME = "file_index.sqlite3"
+# Versão do esquema de nomes das partições. Índices com outra versão são
+# reconstruídos pelo indexador (ver needs_rebuild).
+PARTITION_SCHEME = "2"
+
+
+def partition_name(source_table: str) -> str:
+    """
+    Nome da coleção da tabela: a parte legível é saneada e truncada, e o hash
+    do nome original evita que tabelas diferentes caiam na mesma coleção. O
+    nome termina sempre em caractere alfanumérico, como o Chroma exige.
+    """
+    raw = source_table or "sem_origem"
+    readable = re.sub(r"[^A-Za-z0-9_-]", "_", raw)[:45]
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:8]
+    return f"{PARTITION_PREFIX}{readable}_{digest}"
+
+
+def source_of_chunk(chunk_id: str) -> str:
+    """Os ids de chunk começam pelo doc_key, que começa pela tabela de origem."""
+    return chunk_id.split(":", 1)[0]
+
+
+def filter_values(condition) -> set:
+    """
+    Valores aceitos por uma condição de igualdade do Chroma: valor simples,
+    {"$eq": v} ou {"$in": [...]}. None para outros operadores ($ne, $nin, ...),
+    que a partição não resolve e ficam no filtro enviado ao Chroma.
+    """
+    if isinstance(condition, dict):
+        if set(condition) == {"$eq"}:
+            return {condition["$eq"]}
+        if set(condition) == {"$in"} and isinstance(condition["$in"], (list, tuple)):
+            return set(condition["$in"])
+        return None
+    return {condition}
+
+
+def build_where(source_filter: dict):
+    """Filtro do Chroma para as chaves que a partição não resolve sozinha."""
+    conditions = [{field: value} for field, value in source_filter.items()]
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class FileIndex:
+    """Índice de metadados: file_name -> (source_table, chunk_id)."""
+
+    def __init__(self, persist_directory: str):
+        os.makedirs(persist_directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            os.path.join(persist_directory, FILE_INDEX_FILE_NAME), check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS file_chunks (
+                chunk_id TEXT PRIMARY KEY,
+                file_name TEXT NOT NULL,
+                source_table TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_file_chunks_name ON file_chunks (file_name);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self.conn.commit()
+
+    def add(self, ids: list, metadatas: list):
+        rows = [
+            (cid, str(metadata["file_name"]), metadata.get("source_table"))
+            for cid, metadata in zip(ids, metadatas)
+            if metadata.get("file_name") is not None
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_chunks (chunk_id, file_name, source_table) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def remove(self, ids: list):
+        with self._lock, self.conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self.conn.execute(
+                    f"DELETE FROM file_chunks WHERE chunk_id IN ({placeholders})", chunk
+                )
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM file_chunks")
+
+    def partition_scheme(self):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'partition_scheme'").fetchone()
+        return row[0] if row else None
+
+    def set_partition_scheme(self, scheme: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('partition_scheme', ?)",
+                (scheme,),
+            )
+
+    def sources_of(self, file_name: str) -> set:
+        with self._lock:
+            return {
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT DISTINCT source_table FROM file_chunks WHERE file_name = ?",
+                    (file_name,),
+                )
+            }
+
+    def chunk_ids(self, file_name: str) -> list:
+        with self._lock:
+            return [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT chunk_id FROM file_chunks WHERE file_name = ?", (file_name,)
+                )
+            ]
+
+
+class PartitionedChroma:
+    def __init__(self, persist_directory: str, embedding_function: Embeddings = None):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.file_index = FileIndex(persist_directory)
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def _collection_names(self) -> set:
+        # Versões novas do chromadb listam nomes; as antigas, objetos Collection.
+        return {getattr(c, "name", c) for c in self.client.list_collections()}
+
+    def _store(self, name: str) -> Chroma:
+        with self._lock:
+            if name not in self._partitions:
+                self._partitions[name] = Chroma(
+                    client=self.client,
+                    collection_name=name,
+                    embedding_function=self.embedding_function,
+                )
+            return self._partitions[name]
+
+    def _forget(self, name: str):
+        with self._lock:
+            self._partitions.pop(name, None)
+
+    def partitions(self) -> list:
+        names = self._collection_names()
+        # Coleções apagadas por outro processo (o indexador) saem do cache de wrappers.
+        with self._lock:
+            for stale in [name for name in self._partitions if name not in names]:
+                del self._partitions[stale]
+        return sorted(name for name in names if name.startswith(PARTITION_PREFIX))
+
+    def has_legacy_collection(self) -> bool:
+        """Índice criado antes do particionamento (uma coleção única com tudo)."""
+        return LEGACY_COLLECTION_NAME in self._collection_names()
+
+    def needs_rebuild(self) -> bool:
+        """Coleção única antiga ou partições com nomes de outro esquema."""
+        if self.has_legacy_collection():
+            return True
+        return bool(self.partitions()) and (
+            self.file_index.partition_scheme() != PARTITION_SCHEME
+        )
+
+    # Escrita (indexador)
+
+    def upsert(self, ids: list, embeddings: list, documents: list, metadatas: list):
+        # Índice novo: as partições já nascem no esquema atual.
+        if self.file_index.partition_scheme() is None and not self.partitions():
+            self.file_index.set_partition_scheme(PARTITION_SCHEME)
+
+        groups = {}
+        for row in zip(ids, embeddings, documents, metadatas):
+            groups.setdefault(partition_name(row[3].get("source_table")), []).append(row)
+
+        for name, rows in groups.items():
+            part_ids, part_embeddings, part_documents, part_metadatas = map(list, zip(*rows))
+            self._store(name)._collection.upsert(
+                ids=part_ids,
+                embeddings=part_embeddings,
+                documents=part_documents,
+                metadatas=part_metadatas,
+            )
+        self.file_index.add(ids, metadatas)
+
+    def delete(self, ids: list = None):
+        groups = {}
+        for cid in ids or []:
+            groups.setdefault(partition_name(source_of_chunk(cid)), []).append(cid)
+        existing = set(self.partitions())
+        for name, part_ids in groups.items():
+            if name in existing:
+                self._store(name).delete(ids=part_ids)
+        self.file_index.remove(list(ids or []))
+
+    def delete_collection(self):
+        for name in self.partitions() + (
+            [LEGACY_COLLECTION_NAME] if self.has_legacy_collection() else []
+        ):
+            self.client.delete_collection(name)
+        with self._lock:
+            self._partitions = {}
+        self.file_index.clear()
+        self.file_index.set_partition_scheme(PARTITION_SCHEME)
+
+    def get(self, limit: int = None, offset: int = 0, include: list = None) -> dict:
+        """Página de chunks percorrendo as partições em ordem."""
+        page = {"ids": [], "documents": [], "metadatas": []}
+        for name in self.partitions():
+            if limit is not None and len(page["ids"]) >= limit:
+                break
+            store = self._store(name)
+            size = store._collection.count()
+            if offset >= size:
+                offset -= size
+                continue
+            wanted = None if limit is None else limit - len(page["ids"])
+            part = store.get(limit=wanted, offset=offset, include=["documents", "metadatas"])
+            offset = 0
+            for key in page:
+                page[key].extend(part[key])
+        return page
+
+    # Leitura (retriever)
+
+    def _target_partitions(self, existing: list, source_filter: dict) -> tuple:
+        """(partições a consultar, filtro restante para o Chroma)."""
+        remaining = dict(source_filter or {})
+
+        # Operadores no topo ($and, $or) vão inteiros para o Chroma, em todas as partições.
+        tables = filter_values(remaining.get("source_table"))
+        if "source_table" in remaining and tables is not None:
+            remaining.pop("source_table")
+            names = {partition_name(table) for table in tables}
+            return [name for name in existing if name in names], remaining
+
+        files = filter_values(remaining.get("file_name"))
+        if "file_name" in remaining and files is not None:
+            names = {
+                partition_name(source)
+                for file_name in files
+                for source in self.file_index.sources_of(str(file_name))
+            }
+            return [name for name in existing if name in names], remaining
+
+        return existing, remaining
+
+    def _search_partition(self, name: str, embedding: list, kwargs: dict) -> list:
+        try:
+            return self._store(name).similarity_search_by_vector_with_relevance_scores(
+                embedding, **kwargs
+            )
+        except Exception as e:
+            if "does not exist" not in str(e).lower():
+                raise
+            # Coleção recriada com o mesmo nome (reindexação completa): o wrapper
+            # guardado aponta para o id antigo. Abre de novo e tenta uma vez.
+            self._forget(name)
+            return self._store(name).similarity_search_by_vector_with_relevance_scores(
+                embedding, **kwargs
+            )
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None) -> list:
+        existing = self.partitions()
+
+        if not existing and self.has_legacy_collection():
+            kwargs = {"k": k}
+            if filter:
+                kwargs["filter"] = build_where(filter)
+            return self._store(LEGACY_COLLECTION_NAME).similarity_search(query, **kwargs)
+
+        names, remaining = self._target_partitions(existing, filter)
+        if not names:
+            return []
+
+        where = build_where(remaining)
+        embedding = self.embedding_function.embed_query(query)
+        scored = []
+        for name in names:
+            kwargs = {"k": k}
+            if where:
+                kwargs["filter"] = where
+            scored.extend(self._search_partition(name, embedding, kwargs))
+
+        # O score do Chroma é distância: menor é melhor.
+        scored.sort(key=lambda item: item[1])
+        return [doc for doc, _ in scored[:k]]
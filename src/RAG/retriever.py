@@ -0,0 +1,109 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+
+from src.cache.cache import ManualCachedEmbedder
+from src.RAG.mmap_vector_store import MmapVectorStore
+from src.RAG.partitioned_chroma import PartitionedChroma
+from src.RAG.lexical_index import (
+    LexicalIndex,
+    is_equality_filter,
+    is_identifier_query,
+    reciprocal_rank_fusion,
+)
+
+load_dotenv()
+
+RAG_INDEX_PATH = os.getenv(
+    "RAG_INDEX_PATH", os.path.join(os.path.dirname(__file__), "rag_db_index")
+)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# "chroma" ou "mmap" (matrizes NumPy quantizadas, compartilhadas entre processos).
+RAG_VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+# Candidatos buscados em cada índice antes da fusão (por resultado pedido).
+HYBRID_FETCH_FACTOR = int(os.getenv("RAG_HYBRID_FETCH_FACTOR", "4"))
+
+
+def open_vector_store(persist_directory: str, embedder, backend: str = RAG_VECTOR_BACKEND):
+    if backend == "mmap":
+        return MmapVectorStore(persist_directory, embedding_function=embedder)
+    return PartitionedChroma(persist_directory, embedding_function=embedder)
+
+
+class DocumentRetriever:
+    """
+    Embedder, cache de embeddings e vector store criados uma única vez por
+    processo e compartilhados entre as chamadas de search_documentation.
+
+    A busca é híbrida: os resultados do Chroma e do índice BM25 são fundidos por
+    Reciprocal Rank Fusion. Consultas compostas sobretudo por códigos vão só ao
+    índice lexical, sem chamada de embedding.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = RAG_INDEX_PATH,
+        embedding_model: str = EMBEDDING_MODEL,
+        vector_backend: str = RAG_VECTOR_BACKEND,
+    ):
+        self.persist_directory = persist_directory
+        base_embedder = OpenAIEmbeddings(model=embedding_model)
+        self.embedder = ManualCachedEmbedder(base_embedder=base_embedder)
+        self.vectorstore = open_vector_store(persist_directory, self.embedder, vector_backend)
+        self.lexical = None
+        self._lexical_lock = threading.Lock()
+
+    def _get_lexical_index(self):
+        """O índice lexical só existe depois da primeira indexação que o constrói."""
+        if self.lexical is None:
+            with self._lexical_lock:
+                if self.lexical is None:
+                    self.lexical = LexicalIndex.open_existing(self.persist_directory)
+        return self.lexical
+
+    def search(self, query: str, k: int = 2, source_filter: dict = None) -> list:
+        lexical = self._get_lexical_index()
+        # Filtros com operadores do Chroma não têm equivalente no índice lexical.
+        if not is_equality_filter(source_filter):
+            lexical = None
+
+        # Atalho só quando os próprios códigos aparecem nos chunks; senão, um
+        # termo comum da query ("manual") traria trechos sem relação.
+        if lexical and is_identifier_query(query):
+            docs = lexical.search(
+                query, k=k, source_filter=source_filter, require_identifiers=True
+            )
+            if docs:
+                return docs
+
+        fetch_k = k * HYBRID_FETCH_FACTOR if lexical else k
+        search_kwargs = {"k": fetch_k}
+
+        if source_filter:
+            search_kwargs["filter"] = source_filter
+
+        vector_docs = self.vectorstore.similarity_search(query, **search_kwargs)
+        if not lexical:
+            return vector_docs
+
+        lexical_docs = lexical.search(query, k=fetch_k, source_filter=source_filter)
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], k)
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_document_retriever() -> DocumentRetriever:
+    """Retorna o DocumentRetriever do processo, criando-o na primeira chamada."""
+    global _retriever
+
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                print(f"Carregando índice de documentos de '{RAG_INDEX_PATH}'...")
+                _retriever = DocumentRetriever()
+
+    return _retriever
@@ -1,17 +1,26 @@
 from src.tools.machines.machines import machines_names
 from src.tools.machines.formated_machines import formated_machines
 from src.dude.filter import Filter
-from src.cache.cache import ManualCachedEmbedder
 from src.db.get_live_data import LiveData
+from src.db.live_status_feed import LiveStatusFeed
+from src.dude.work_order_mirror import get_work_order_mirror
 from src.tools.fuzzy_matcher import FuzzyMatcher
-
+from src.RAG.retriever import get_document_retriever
+from src.cache.semantic_response_cache import (
+    SemanticResponseCache,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_DOC_TTL,
+    SEMANTIC_CACHE_LIVE_TTL,
+)
+from src.cache.tool_cache import cached_tool, tool_cache_stats
+
+import os
+import asyncio
 from dotenv import load_dotenv
 from typing import Optional
 
 from langchain import hub
 from langchain_openai import ChatOpenAI
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain_core.tools import tool
 
@@ -27,23 +36,43 @@ As @tool decorators definem as ferramentas que o assistente pode usar, não util
 
 load_dotenv()
 
+# Ferramentas cujas respostas mudam a cada minuto: não entram no cache semântico
+# (ou entram só com SEMANTIC_CACHE_LIVE_TTL).
+LIVE_DATA_TOOLS = {
+    "get_live_general_status",
+    "get_live_machine_status",
+    "get_live_product_status",
+    "search_service_orders_api",
+}
+DOCUMENTATION_TOOLS = {"search_documentation"}
+
+# TTL padrão (s) do cache de resultado de cada ferramenta; ver src/cache/tool_cache.py.
+LIVE_TOOL_CACHE_TTL = 5
+SERVICE_ORDERS_TOOL_CACHE_TTL = 60
+DOCUMENTATION_TOOL_CACHE_TTL = 3600
+
 
 @tool
-def get_live_general_status() -> str:
+@cached_tool(ttl=LIVE_TOOL_CACHE_TTL)
+def get_live_general_status(
+    mode: str = "resumo",
+    columns: Optional[list[str]] = None,
+    offset: int = 0,
+) -> str:
     """
     Use esta ferramenta para obter o status em tempo real das maquinas e produtos.
     Quando não for informado uma máquina específica, retorna o status geral de todas as máquinas e produtos.
+    - mode: "resumo" (padrão) traz a quantidade de máquinas por status e a lista das paradas.
+      "detalhado" traz as linhas de máquinas e produtos, paginadas.
+    - columns: no modo "detalhado", lista opcional de colunas para trazer apenas o necessário.
+    - offset: no modo "detalhado", use o "proximo_offset" da resposta anterior para buscar a próxima página.
     """
 
-    return LiveData.execute_query(
-        query="""
-                SELECT * FROM products_status 
-                JOIN machines_status ON products_status.machine_name = machines_status.machine_name;
-            """
-    )
+    return LiveData.get_general_status(mode=mode, columns=columns, offset=offset)
 
 
 @tool
+@cached_tool(ttl=LIVE_TOOL_CACHE_TTL, case_insensitive=("machine_name_db",))
 def get_live_machine_status(machine_name_db: str) -> str:
     """Use esta ferramenta para obter o status em tempo real de uma máquina ou tear específico. Forneça o nome ou identificador da máquina."""
 
@@ -52,13 +81,11 @@ def get_live_machine_status(machine_name_db: str) -> str:
         if not canonical_equipment_name:
             return f"Equipamento '{machine_name_db}' não encontrado na lista de máquinas válidas."
 
-    return LiveData.execute_query_machine(
-        query="SELECT * FROM machines_status WHERE machine_name LIKE ?",
-        canonical_equipment_name=canonical_equipment_name,
-    )
+    return LiveData.get_machine_status(canonical_equipment_name)
 
 
 @tool
+@cached_tool(ttl=LIVE_TOOL_CACHE_TTL, case_insensitive=("machine_name_db",))
 def get_live_product_status(machine_name_db: str) -> str:
     """Use esta ferramenta para obter o status em tempo real de um PRODUTO específico. Forneça o nome ou identificador da máquina."""
 
@@ -67,13 +94,13 @@ def get_live_product_status(machine_name_db: str) -> str:
         if not canonical_equipment_name:
             return f"Equipamento '{machine_name_db}' não encontrado na lista de máquinas válidas."
 
-    return LiveData.execute_query_machine(
-        query="SELECT * FROM products_status WHERE machine_name LIKE ?",
-        canonical_equipment_name=canonical_equipment_name,
-    )
+    return LiveData.get_product_status(canonical_equipment_name)
 
 
 @tool
+@cached_tool(
+    ttl=SERVICE_ORDERS_TOOL_CACHE_TTL, case_insensitive=("user_input", "equipment_name")
+)
 def search_service_orders_api(
     user_input: str,
     equipment_name: Optional[str] = None,
@@ -114,9 +141,12 @@ def search_service_orders_api(
 
 
 @tool
+@cached_tool(ttl=DOCUMENTATION_TOOL_CACHE_TTL)
 def search_documentation(query: str, source_filter: Optional[dict] = None) -> str:
     """
     Busca informações em documentos, manuais e procedimentos da empresa.
+    Códigos, números de peça e identificadores de máquina devem ir na query
+    exatamente como foram escritos (ex.: "M-102", "PN 4471-A").
     Para buscas focadas, use o parâmetro 'source_filter' com um dicionário.
     Exemplo para filtrar por nome de arquivo: {"file_name": "Analista de Automação Sr - 1.057 .pdf"}
     Exemplo para filtrar por tipo de documento (tabela): {"source_table": "mantas"}
@@ -124,24 +154,7 @@ def search_documentation(query: str, source_filter: Optional[dict] = None) -> st
     print("--- ATIVANDO FERRAMENTA: search_documentation ---")
     print(f"Query: '{query}', Filtro: {source_filter}")
 
-    db_path = r"C:\Users\Rafael\Desktop\Projeto 2025\Modelo\src\RAG\rag_db_index"
-
-    base_embedder = OpenAIEmbeddings(model="text-embedding-3-small")
-    cached_embedder = ManualCachedEmbedder(base_embedder=base_embedder)
-
-    vectorstore = Chroma(
-        persist_directory=db_path,
-        embedding_function=cached_embedder,
-    )
-
-    search_kwargs = {"k": 2}
-
-    if source_filter:
-        search_kwargs["filter"] = source_filter
-
-    retriever = vectorstore.as_retriever(search_kwargs=search_kwargs)
-
-    docs = retriever.invoke(query)
+    docs = get_document_retriever().search(query, k=2, source_filter=source_filter)
 
     if not docs:
         return "Nenhuma informação relevante foi encontrada para esta consulta com os filtros aplicados."
@@ -162,11 +175,34 @@ class IntelligentAssistant:
         load_dotenv()
 
         try:
-            redis_url = "redis://localhost:6379/0"
+            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
             set_llm_cache(RedisCache(redis_url=redis_url))
         except Exception as e:
             print(f"AVISO: Cache de LLM com Redis desativado. Erro: {e}")
 
+        # Com o feed ligado, as ferramentas de status respondem da memória e o
+        # banco recebe apenas uma consulta de delta por intervalo.
+        self.live_status_feed = None
+        if os.getenv("LIVE_STATUS_FEED", "false").lower() == "true":
+            self.live_status_feed = LiveStatusFeed()
+            self.live_status_feed.start()
+
+        # Com DUDE_MIRROR ligado, as ordens de serviço são consultadas no espelho
+        # local, sincronizado em segundo plano pelo DateLastModified.
+        self.work_order_mirror = get_work_order_mirror()
+        if self.work_order_mirror:
+            self.work_order_mirror.start()
+
+        # Carrega o índice de documentos já na inicialização, para que a primeira
+        # pergunta não pague a criação do cliente e a carga da coleção.
+        self.response_cache = None
+        try:
+            retriever = get_document_retriever()
+            if SEMANTIC_CACHE_ENABLED:
+                self.response_cache = SemanticResponseCache(retriever.embedder)
+        except Exception as e:
+            print(f"AVISO: índice de documentos não carregado na inicialização. Erro: {e}")
+
         self.llm = ChatOpenAI(model="gpt-4.1", temperature=0)
         self.tools = self._create_tools()
 
@@ -174,7 +210,13 @@ class IntelligentAssistant:
         prompt.input_variables.append("chat_history")
         agent = create_openai_functions_agent(self.llm, self.tools, prompt)
 
-        self.agent_executor = AgentExecutor(agent=agent, tools=self.tools, verbose=True)
+        # Os passos intermediários dizem quais ferramentas embasaram a resposta.
+        self.agent_executor = AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=True,
+            return_intermediate_steps=True,
+        )
 
     def _create_tools(self) -> list:
         print("Criando ferramenta de RAG com MultiQueryRetriever...")
@@ -187,11 +229,73 @@ class IntelligentAssistant:
             search_documentation,
         ]
 
+    def cache_stats(self) -> dict:
+        return {
+            "respostas": self.response_cache.stats() if self.response_cache else None,
+            "ferramentas": tool_cache_stats(),
+        }
+
+    def _cached_answer(self, user_input: str, chat_history: list):
+        # Com histórico, a pergunta ("e a segunda?") depende da conversa do
+        # usuário; a chave só com a pergunta serviria a resposta a outra conversa.
+        if not self.response_cache or chat_history:
+            return None
+        try:
+            return self.response_cache.lookup(user_input)
+        except Exception as e:
+            print(f"AVISO: falha ao consultar o cache de respostas: {e}")
+            return None
+
+    def _remember_answer(self, user_input: str, chat_history: list, response: dict):
+        """Guarda a resposta com o TTL adequado às ferramentas que ela usou."""
+        if not self.response_cache or chat_history or "output" not in response:
+            return
+
+        used_tools = {action.tool for action, _ in response.get("intermediate_steps", [])}
+        if used_tools & LIVE_DATA_TOOLS:
+            ttl = SEMANTIC_CACHE_LIVE_TTL
+        elif used_tools and used_tools <= DOCUMENTATION_TOOLS:
+            ttl = SEMANTIC_CACHE_DOC_TTL
+        else:
+            # Sem ferramenta, a resposta costuma depender da conversa.
+            ttl = 0
+
+        try:
+            self.response_cache.store(user_input, response["output"], ttl)
+        except Exception as e:
+            print(f"AVISO: falha ao gravar no cache de respostas: {e}")
+
     def run(self, user_input: str, chat_history: list) -> str:
         try:
+            cached_answer = self._cached_answer(user_input, chat_history)
+            if cached_answer is not None:
+                return cached_answer
+
             response = self.agent_executor.invoke(
                 {"input": user_input, "chat_history": chat_history}
             )
+            self._remember_answer(user_input, chat_history, response)
+
+            return response.get("output", "Não obtive uma resposta.")
+
+        except Exception:
+            return "Desculpe, enfrentei um problema técnico e não consegui processar sua solicitação."
+
+    async def arun(self, user_input: str, chat_history: list) -> str:
+        try:
+            # O embedding da pergunta é uma chamada bloqueante.
+            cached_answer = await asyncio.to_thread(
+                self._cached_answer, user_input, chat_history
+            )
+            if cached_answer is not None:
+                return cached_answer
+
+            response = await self.agent_executor.ainvoke(
+                {"input": user_input, "chat_history": chat_history}
+            )
+            await asyncio.to_thread(
+                self._remember_answer, user_input, chat_history, response
+            )
 
             return response.get("output", "Não obtive uma resposta.")
 
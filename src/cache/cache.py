@@ -1,49 +1,229 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
 from langchain_core.embeddings import Embeddings
-from typing import Optional, List
+from typing import Optional, List, Dict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Limite da camada em memória, por processo. Cada vetor de 1536 dimensões ocupa ~6 KB.
+EMBEDDING_CACHE_MEMORY_MB = float(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "64"))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "embedding_cache.sqlite3"),
+)
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false").lower() == "true"
+EMBEDDING_CACHE_REDIS_PREFIX = "embedding:"
+# Custo aproximado de cada entrada do LRU além do vetor: chave, objeto array e nó do dicionário.
+_ENTRY_OVERHEAD_BYTES = 200
+
+"""
+Cache de embeddings em camadas: LRU em memória -> SQLite em disco -> Redis (opcional).
+A chave é o hash do conteúdo junto com o nome do modelo, e os vetores são
+guardados como float32, então o mesmo texto nunca é embedado duas vezes, nem
+entre reinícios nem entre execuções do indexador. Na memória os vetores também
+ficam em array('f'), limitados por bytes, e só viram listas de float na saída.
+"""
+
+
+def _to_bytes(embedding: List[float]) -> bytes:
+    return array("f", embedding).tobytes()
+
+
+def _from_bytes(data: bytes) -> array:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector
+
+
+def _as_list(embedding) -> List[float]:
+    return embedding.tolist() if isinstance(embedding, array) else embedding
+
+
+class DiskEmbeddingStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL permite que vários processos (consumidores e indexador) leiam e gravem juntos.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        with self._lock:
+            # Em blocos, para não passar do limite de parâmetros do SQLite.
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                items.items(),
+            )
+            self._conn.commit()
+
+
+class RedisEmbeddingStore:
+    def __init__(self, redis_url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(redis_url)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        values = self.client.mget([EMBEDDING_CACHE_REDIS_PREFIX + key for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, items: Dict[str, bytes]):
+        self.client.mset(
+            {EMBEDDING_CACHE_REDIS_PREFIX + key: value for key, value in items.items()}
+        )
+
 
 class ManualCachedEmbedder(Embeddings):
 
-    def __init__(self, base_embedder: Embeddings):
+    def __init__(
+        self,
+        base_embedder: Embeddings,
+        model_name: Optional[str] = None,
+        memory_bytes: int = int(EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024),
+        disk_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        use_redis: bool = EMBEDDING_CACHE_REDIS,
+    ):
         self.base_embedder = base_embedder
-        self.cache = {}
+        self.model_name = model_name or getattr(base_embedder, "model", None) or "unknown"
+        self.memory_bytes = memory_bytes
+        # chave -> array('f'), do menos para o mais recente.
+        self.cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+        # Camadas persistentes, da mais rápida para a mais lenta.
+        self.stores = []
+        if disk_path:
+            try:
+                self.stores.append(DiskEmbeddingStore(disk_path))
+            except sqlite3.Error as e:
+                print(f"AVISO: cache de embeddings em disco desativado. Erro: {e}")
+        if use_redis:
+            try:
+                self.stores.append(
+                    RedisEmbeddingStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+                )
+            except Exception as e:
+                print(f"AVISO: cache de embeddings no Redis desativado. Erro: {e}")
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_from_cache(self, key: str) -> Optional[array]:
+        with self._lock:
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                self.cache.move_to_end(key)
+            return embedding
+
+    @staticmethod
+    def _entry_bytes(vector: array) -> int:
+        return vector.itemsize * len(vector) + _ENTRY_OVERHEAD_BYTES
+
+    def _add_to_cache(self, key: str, embedding):
+        vector = embedding if isinstance(embedding, array) else array("f", embedding)
+        with self._lock:
+            previous = self.cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= self._entry_bytes(previous)
+            self.cache[key] = vector
+            self._cache_bytes += self._entry_bytes(vector)
+            while self.cache and self._cache_bytes > self.memory_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self._cache_bytes -= self._entry_bytes(evicted)
 
-    def _get_from_cache(self, text: str) -> Optional[List[float]]:
-        return self.cache.get(text)
+    def _lookup(self, keys: List[str]) -> Dict[str, array]:
+        """Procura as chaves em todas as camadas, promovendo o que achar para as mais rápidas."""
+        found = {}
+        for key in keys:
+            embedding = self._get_from_cache(key)
+            if embedding is not None:
+                found[key] = embedding
 
-    def _add_to_cache(self, text: str, embedding: List[float]):
-        self.cache[text] = embedding
+        missing = [key for key in keys if key not in found]
+        for level, store in enumerate(self.stores):
+            if not missing:
+                break
+            try:
+                hits = store.get_many(missing)
+            except Exception as e:
+                print(f"AVISO: falha ao ler o cache de embeddings: {e}")
+                continue
+
+            for key, data in hits.items():
+                found[key] = _from_bytes(data)
+                self._add_to_cache(key, found[key])
+            if hits:
+                for upper in self.stores[:level]:
+                    self._write(upper, hits)
+            missing = [key for key in missing if key not in hits]
+
+        return found
+
+    def _write(self, store, items: Dict[str, bytes]):
+        try:
+            store.set_many(items)
+        except Exception as e:
+            print(f"AVISO: falha ao gravar no cache de embeddings: {e}")
+
+    def _store(self, new_embeddings: Dict[str, List[float]]):
+        for key, embedding in new_embeddings.items():
+            self._add_to_cache(key, embedding)
+
+        if self.stores:
+            items = {key: _to_bytes(embedding) for key, embedding in new_embeddings.items()}
+            for store in self.stores:
+                self._write(store, items)
 
     def embed_query(self, text: str) -> List[float]:
-        cached_embedding = self._get_from_cache(text)
-        
+        key = self._key(text)
+        cached_embedding = self._lookup([key]).get(key)
+
         if cached_embedding is not None:
-            return cached_embedding
-        
+            return _as_list(cached_embedding)
+
         embedding = self.base_embedder.embed_query(text)
-        self._add_to_cache(text, embedding)
+        self._store({key: embedding})
         return embedding
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
 
-        embeddings = []
-        texts_to_embed = []
-        for text in texts:
-            cached_embedding = self._get_from_cache(text)
-            if cached_embedding is not None:
-                embeddings.append(cached_embedding)
-            else:
-                texts_to_embed.append(text)
-                embeddings.append(None)
+        # Textos repetidos no mesmo lote são enviados à API uma vez só.
+        texts_to_embed = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in texts_to_embed:
+                texts_to_embed[key] = text
 
         if texts_to_embed:
-            new_embeddings = self.base_embedder.embed_documents(texts_to_embed)
-            
-            new_embeddings_iter = iter(new_embeddings)
-            for i, emb in enumerate(embeddings):
-                if emb is None:
-                    text_to_cache = texts_to_embed.pop(0)
-                    new_embedding = next(new_embeddings_iter)
-                    embeddings[i] = new_embedding
-                    self._add_to_cache(text_to_cache, new_embedding)
-                    
-        return embeddings
\ No newline at end of file
+            new_embeddings = self.base_embedder.embed_documents(
+                list(texts_to_embed.values())
+            )
+            new_items = dict(zip(texts_to_embed.keys(), new_embeddings))
+            self._store(new_items)
+            found.update(new_items)
+
+        return [_as_list(found[key]) for key in keys]
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_DOC_TTL = int(os.getenv("SEMANTIC_CACHE_DOC_TTL", "86400"))
+# Respostas que usaram dados ao vivo (status, ordens do Dude): 0 = nunca guardar.
+SEMANTIC_CACHE_LIVE_TTL = int(os.getenv("SEMANTIC_CACHE_LIVE_TTL", "0"))
+# Perguntas curtas costumam depender do histórico ("e a outra?") e não entram no cache.
+SEMANTIC_CACHE_MIN_WORDS = int(os.getenv("SEMANTIC_CACHE_MIN_WORDS", "4"))
+
+"""
+Cache semântico de respostas do assistente: a pergunta normalizada é embedada e,
+se uma pergunta já respondida estiver acima do limiar de similaridade, a resposta
+guardada é devolvida sem passar pelo agente. Perguntas idênticas após a
+normalização nem chegam a ser embedadas. Os códigos e números da pergunta
+("tear 12", "M-102") precisam ser idênticos para um acerto semântico: perguntas
+sobre máquinas diferentes ficam muito próximas no embedding.
+
+Só são guardadas respostas que não dependem de dados ao vivo: as que usaram
+apenas a busca em documentos (com TTL) e, se configurado, as de status com um
+TTL curto.
+"""
+
+
+def normalize_question(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s\-]", " ", text)
+    return " ".join(text.split())
+
+
+def identifier_tokens(question: str) -> frozenset:
+    """Números e códigos da pergunta normalizada: tokens com dígitos ou separadores internos."""
+    return frozenset(
+        token
+        for token in (t.strip("-_") for t in question.split())
+        if token and (any(c.isdigit() for c in token) or "-" in token or "_" in token)
+    )
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        embedder,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        min_words: int = SEMANTIC_CACHE_MIN_WORDS,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.min_words = min_words
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._expires = np.zeros(max_entries)
+        # Por posição: (pergunta normalizada, resposta, identificadores) ou None.
+        self._entries = [None] * max_entries
+        self._by_question = {}
+        self._next_slot = 0
+        self.hits = self.misses = self.stored = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def is_cacheable(self, question: str) -> bool:
+        return len(question.split()) >= self.min_words
+
+    def lookup(self, user_input: str):
+        """Retorna a resposta guardada para uma pergunta equivalente, ou None."""
+        question = normalize_question(user_input)
+        if not self.is_cacheable(question):
+            return None
+
+        now = time.time()
+        with self._lock:
+            slot = self._by_question.get(question)
+            if slot is not None and self._expires[slot] > now:
+                self.hits += 1
+                return self._entries[slot][1]
+            has_entries = self._vectors is not None
+
+        if not has_entries:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        query = self._embed(question)
+        identifiers = identifier_tokens(question)
+        with self._lock:
+            scores = self._vectors @ query
+            scores[self._expires <= now] = -np.inf
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                entry = self._entries[slot]
+                if entry[2] == identifiers:
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+        return None
+
+    def store(self, user_input: str, answer: str, ttl: int):
+        question = normalize_question(user_input)
+        if ttl <= 0 or not answer or not self.is_cacheable(question):
+            return
+
+        vector = self._embed(question)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            slot = self._by_question.get(question)
+            if slot is None:
+                # Substitui a entrada mais antiga quando o cache está cheio.
+                slot = self._next_slot
+                self._next_slot = (self._next_slot + 1) % self.max_entries
+                old = self._entries[slot]
+                if old is not None:
+                    self._by_question.pop(old[0], None)
+
+            self._vectors[slot] = vector
+            self._expires[slot] = time.time() + ttl
+            self._entries[slot] = (question, answer, identifier_tokens(question))
+            self._by_question[question] = slot
+            self.stored += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "entries": len(self._by_question),
+            }
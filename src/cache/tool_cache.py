@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "512"))
+
+"""
+Cache de resultados das ferramentas do agente. Cada ferramenta tem seu TTL e
+um LRU limitado; a chave vem dos argumentos normalizados. Por padrão só a
+ordem das chaves de dicionário é ignorada: filtros como file_name e
+source_table são comparados exatamente pelo Chroma e pelo SQLite. Cada
+ferramenta declara em case_insensitive os argumentos em que maiúsculas e
+espaços extras não mudam o resultado (ex.: nomes que passam pelo FuzzyMatcher). Chamadas idênticas que
+chegam ao mesmo tempo, de agentes diferentes, compartilham uma única ida ao
+backend (single-flight).
+
+O TTL de cada ferramenta pode ser trocado por TOOL_CACHE_TTL_<NOME>, por
+exemplo TOOL_CACHE_TTL_SEARCH_DOCUMENTATION=600. TTL 0 desliga o cache da
+ferramenta, mas mantém a coalescência das chamadas simultâneas.
+"""
+
+_registry = {}
+
+
+def tool_cache_ttl(name: str, default: float) -> float:
+    return float(os.getenv(f"TOOL_CACHE_TTL_{name.upper()}", str(default)))
+
+
+def normalize_argument(value, case_insensitive: bool = False):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold() if case_insensitive else value
+    if isinstance(value, dict):
+        return {
+            str(k): normalize_argument(v, case_insensitive)
+            for k, v in sorted(value.items(), key=lambda item: str(item[0]))
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_argument(v, case_insensitive) for v in value]
+    return value
+
+
+class ToolCache:
+    def __init__(self, name: str, ttl: float, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        # chave -> (expira_em, resultado), do menos para o mais recente.
+        self._entries = OrderedDict()
+        # chave -> Future da chamada em andamento.
+        self._in_flight = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    def _get(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def _put(self, key: str, result, now: float):
+        self._entries[key] = (now + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def call(self, key: str, compute):
+        with self._lock:
+            found, result = self._get(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return result
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            # Erros não ficam no cache; quem estava esperando recebe o mesmo erro.
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if self.ttl > 0:
+                self._put(key, result, time.monotonic())
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+            }
+
+
+def cached_tool(
+    ttl: float, max_entries: int = TOOL_CACHE_MAX_ENTRIES, case_insensitive: tuple = ()
+):
+    """
+    Decorador para as funções de ferramenta. Deve ficar abaixo do @tool, para
+    que o LangChain continue lendo a assinatura e a docstring da função original.
+    case_insensitive: nomes dos argumentos comparados sem maiúsculas e espaços extras.
+    """
+
+    def decorator(func):
+        if not TOOL_CACHE_ENABLED:
+            return func
+
+        cache = ToolCache(func.__name__, tool_cache_ttl(func.__name__, ttl), max_entries)
+        _registry[func.__name__] = cache
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = json.dumps(
+                {
+                    name: normalize_argument(value, name in case_insensitive)
+                    for name, value in bound.arguments.items()
+                },
+                sort_keys=True,
+                default=str,
+            )
+            return cache.call(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def tool_cache_stats() -> dict:
+    """Contadores de acerto/erro de todas as ferramentas com cache."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_tool_caches():
+    for cache in _registry.values():
+        cache.clear()
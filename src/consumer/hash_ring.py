@@ -0,0 +1,43 @@
+import bisect
+import hashlib
+
+
+class ConsistentHashRing:
+    """
+    Anel de hash consistente com nós virtuais. Cada chave (userId) cai sempre no
+    mesmo nó; ao adicionar ou remover um nó, só ~1/N das chaves mudam de dono.
+    """
+
+    def __init__(self, nodes: list = None, replicas: int = 160):
+        self.replicas = replicas
+        self._ring = []
+        self._owners = {}
+        for node in nodes or []:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def add_node(self, node: str):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._ring, point)
+
+    def remove_node(self, node: str):
+        self._ring = [point for point in self._ring if self._owners[point] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+
+    def get_node(self, key: str) -> str:
+        if not self._ring:
+            raise ValueError("O anel de hash não possui nenhum nó.")
+
+        index = bisect.bisect(self._ring, self._hash(key)) % len(self._ring)
+        return self._owners[self._ring[index]]
+
+    @property
+    def nodes(self) -> list:
+        return sorted(set(self._owners.values()))
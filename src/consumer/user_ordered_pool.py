@@ -0,0 +1,61 @@
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UserOrderedPool:
+    """
+    Pool de threads que processa mensagens de usuários diferentes em paralelo,
+    garantindo que as mensagens de um mesmo usuário sejam executadas em ordem,
+    uma de cada vez.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bot-worker"
+        )
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn, *args):
+        """Agenda fn(*args) na fila do usuário 'key'."""
+        with self._lock:
+            queue = self._pending.get(key)
+            if queue is not None:
+                # Já existe uma tarefa desse usuário em execução: entra na fila dele.
+                queue.append((fn, args))
+                return
+            self._pending[key] = deque()
+
+        self._executor.submit(self._run, key, fn, args)
+
+    def _run(self, key: str, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"   [!] ERRO no worker do usuário '{key}': {e}")
+            traceback.print_exc()
+
+        with self._lock:
+            queue = self._pending[key]
+            if not queue:
+                del self._pending[key]
+                return
+            next_fn, next_args = queue.popleft()
+
+        # Reenvia ao executor em vez de seguir no loop, para que um usuário com
+        # muitas mensagens não monopolize o worker.
+        try:
+            self._executor.submit(self._run, key, next_fn, next_args)
+        except RuntimeError:
+            # Executor em shutdown: drena a fila do usuário nesta mesma thread.
+            self._run(key, next_fn, next_args)
+
+    def pending_users(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,246 @@
+import os
+import json
+import queue
+import atexit
+import threading
+import time
+from datetime import datetime, timezone
+
+import pyodbc
+from dotenv import load_dotenv
+
+from src.db.db_connector import Db_Connection
+
+load_dotenv()
+
+BOT_LOG_BATCH_SIZE = int(os.getenv("BOT_LOG_BATCH_SIZE", "100"))
+BOT_LOG_FLUSH_INTERVAL = float(os.getenv("BOT_LOG_FLUSH_INTERVAL", "2"))
+BOT_LOG_QUEUE_SIZE = int(os.getenv("BOT_LOG_QUEUE_SIZE", "10000"))
+BOT_LOG_SPILL_PATH = os.getenv("BOT_LOG_SPILL_PATH", "bot_logs_spill.jsonl")
+# Quantas linhas do arquivo local são reenviadas por flush, para limitar a memória.
+BOT_LOG_SPILL_REPLAY = int(os.getenv("BOT_LOG_SPILL_REPLAY", "1000"))
+# Linhas que o banco recusa sozinhas (ex.: userId maior que a coluna) ficam aqui,
+# fora do arquivo de reenvio, para não travar os próximos lotes.
+BOT_LOG_QUARANTINE_PATH = os.getenv("BOT_LOG_QUARANTINE_PATH", "bot_logs_rejected.jsonl")
+
+INSERT_QUERY = """
+    INSERT INTO bot_logs (userId, botMessage, botTimeStamp)
+    VALUES (?, ?, ?);
+"""
+
+_STOP = object()
+
+# Erros causados pelo conteúdo da linha; os demais (conexão, timeout, tabela
+# ausente, permissão) são tratados como indisponibilidade do banco.
+ROW_ERRORS = (pyodbc.DataError, pyodbc.IntegrityError)
+
+
+def shard_path(path: str) -> str:
+    """
+    Arquivo local do processo: no modo shardeado, cada shard (BOT_LOG_SHARD, definido
+    pelo sharded_consumer) tem o seu, e nenhum reenvia ou apaga linhas de outro.
+    Ex.: bot_logs_spill.jsonl -> bot_logs_spill.shard-0.jsonl.
+    """
+    shard = os.getenv("BOT_LOG_SHARD")
+    if not shard:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{shard}{ext}"
+
+
+class BotLogWriter:
+    """
+    Grava os logs do bot em segundo plano (write-behind): as respostas entram numa
+    fila limitada e são inseridas em lote com fast_executemany quando o lote enche
+    ou o intervalo expira. Se o SQL Server estiver fora, ou a fila estiver cheia,
+    os registros vão para um arquivo local e são reenviados no próximo flush bem-sucedido.
+
+    O arquivo local só recebe acréscimos: o reenvio lê blocos a partir de um
+    offset salvo ao lado dele, e o arquivo é apagado quando é todo reenviado.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BOT_LOG_BATCH_SIZE,
+        flush_interval: float = BOT_LOG_FLUSH_INTERVAL,
+        queue_size: int = BOT_LOG_QUEUE_SIZE,
+        spill_path: str = None,
+        quarantine_path: str = None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path or shard_path(BOT_LOG_SPILL_PATH)
+        self.offset_path = self.spill_path + ".offset"
+        self.quarantine_path = quarantine_path or shard_path(BOT_LOG_QUARANTINE_PATH)
+        self.db_manager = Db_Connection()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._spill_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="bot-log-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, user_id: str, message: str):
+        """Enfileira a resposta sem bloquear; o horário é o do momento da resposta."""
+        row = (
+            user_id,
+            message,
+            datetime.now(timezone.utc).isoformat(sep=" ", timespec="microseconds"),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            print("   [!] Fila de logs cheia. Gravando no arquivo local.")
+            self._spill([row])
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                return
+
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch: list):
+        pending, next_offset = self._read_spill()
+        rows = pending + batch
+        if not rows:
+            return
+
+        try:
+            with self.db_manager as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.fast_executemany = True
+                    cursor.executemany(INSERT_QUERY, rows)
+                    conn.commit()
+                except ROW_ERRORS as e:
+                    # Uma linha ruim derruba o lote inteiro: regrava linha a linha
+                    # e separa só as que o banco recusa.
+                    conn.rollback()
+                    print(f"Erro ao gravar o lote de {len(rows)} logs: {e}. Gravando linha a linha.")
+                    self._quarantine(self._insert_one_by_one(conn, rows))
+        except Exception as e:
+            print(f"Erro ao gravar {len(rows)} logs no banco: {e}. Gravando no arquivo local.")
+            # O que veio do arquivo continua lá; só o lote novo é acrescentado.
+            self._spill(batch)
+            return
+
+        self._advance_spill(next_offset)
+
+    def _insert_one_by_one(self, conn, rows: list) -> list:
+        """Insere cada linha na sua transação. Retorna as recusadas pelo banco."""
+        rejected = []
+        cursor = conn.cursor()
+        for row in rows:
+            try:
+                cursor.execute(INSERT_QUERY, row)
+                conn.commit()
+            except ROW_ERRORS as e:
+                conn.rollback()
+                print(f"   [!] Log recusado pelo banco (userId='{row[0]}'): {e}")
+                rejected.append(row)
+        return rejected
+
+    def _write_lines(self, path: str, rows: list):
+        with open(path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def _spill(self, rows: list):
+        if not rows:
+            return
+        with self._spill_lock:
+            self._write_lines(self.spill_path, rows)
+
+    def _quarantine(self, rows: list):
+        if not rows:
+            return
+        print(f"   [!] {len(rows)} logs recusados movidos para '{self.quarantine_path}'.")
+        with self._spill_lock:
+            self._write_lines(self.quarantine_path, rows)
+
+    def _spill_offset(self) -> int:
+        try:
+            with open(self.offset_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _read_spill(self) -> tuple:
+        """Até BOT_LOG_SPILL_REPLAY linhas a partir do offset salvo; retorna (linhas, offset seguinte)."""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return [], 0
+            offset = self._spill_offset()
+            if offset > os.path.getsize(self.spill_path):
+                offset = 0
+            rows = []
+            with open(self.spill_path, "rb") as f:
+                f.seek(offset)
+                while len(rows) < BOT_LOG_SPILL_REPLAY:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(tuple(json.loads(line)))
+                    except ValueError:
+                        print("   [!] Linha corrompida ignorada no arquivo local de logs.")
+                return rows, f.tell()
+
+    def _advance_spill(self, offset: int):
+        """Marca como reenviado tudo até offset; apaga o arquivo quando ele acaba."""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path) or offset == self._spill_offset():
+                return
+            if offset >= os.path.getsize(self.spill_path):
+                os.remove(self.spill_path)
+                if os.path.exists(self.offset_path):
+                    os.remove(self.offset_path)
+                return
+            tmp_path = self.offset_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(offset))
+            os.replace(tmp_path, self.offset_path)
+
+    def _drain(self) -> list:
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if item is not _STOP:
+                rows.append(item)
+
+    def close(self, timeout: float = 30):
+        """Esvazia a fila e grava o último lote. Chamado também no encerramento do processo."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # O writer está travado (ex.: banco sem responder): o que ainda está
+            # na fila vai para o arquivo local, para ser reenviado depois.
+            print("   [!] Fila de logs não esvaziou a tempo. Gravando o restante no arquivo local.")
+            self._spill(self._drain())
+            return
+        self._thread.join(timeout)
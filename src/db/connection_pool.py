@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import pyodbc
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "30"))
+
+# SQLSTATE da classe 08 indica falha de conexão: a conexão não volta para o pool.
+CONNECTION_ERROR_SQLSTATE_PREFIX = "08"
+
+
+def is_connection_error(error: BaseException) -> bool:
+    if isinstance(error, (pyodbc.OperationalError, pyodbc.InterfaceError)):
+        return True
+    if isinstance(error, pyodbc.Error) and error.args:
+        return str(error.args[0]).startswith(CONNECTION_ERROR_SQLSTATE_PREFIX)
+    return False
+
+
+class ConnectionPool:
+    """
+    Pool de conexões pyodbc thread-safe para uma string de conexão. Reaproveita
+    conexões abertas, verifica a saúde das que ficaram paradas, fecha as ociosas
+    há muito tempo e reabre automaticamente as que falharam.
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        name: str = "default",
+        max_size: int = DB_POOL_MAX_SIZE,
+        idle_timeout: float = DB_POOL_IDLE_TIMEOUT,
+        health_check_after: float = DB_POOL_HEALTH_CHECK_AFTER,
+        acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT,
+    ):
+        self.conn_str = conn_str
+        self.name = name
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._discarded = 0
+        self._health_check_failures = 0
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _prune_idle(self, now: float):
+        # As mais antigas ficam à esquerda: o pool devolve sempre a mais recente (LIFO).
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._close_quietly(conn)
+            self._discarded += 1
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._prune_idle(now)
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+
+                if self._in_use < self.max_size:
+                    conn, last_used = None, now
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Nenhuma conexão livre no pool '{self.name}' após {self.acquire_timeout}s."
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            wait_time = time.monotonic() - started
+            if waited:
+                self._waits += 1
+            self._wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+
+        if conn is not None and time.monotonic() - last_used > self.health_check_after:
+            if not self._is_healthy(conn):
+                self._close_quietly(conn)
+                conn = None
+                with self._cond:
+                    self._health_check_failures += 1
+                    self._discarded += 1
+
+        if conn is None:
+            try:
+                conn = pyodbc.connect(self.conn_str)
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._misses += 1
+
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        if not discard:
+            try:
+                # Nada de transação pendente volta para o pool.
+                conn.rollback()
+            except pyodbc.Error:
+                discard = True
+
+        if discard:
+            self._close_quietly(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException as e:
+            self.release(conn, discard=is_connection_error(e))
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._in_use + len(self._idle),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "misses": self._misses,
+                "waits": self._waits,
+                "avg_wait_ms": round(self._wait_time * 1000 / self._checkouts, 3)
+                if self._checkouts
+                else 0.0,
+                "max_wait_ms": round(self._max_wait_time * 1000, 3),
+                "discarded": self._discarded,
+                "health_check_failures": self._health_check_failures,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_str: str, name: str = "default") -> ConnectionPool:
+    """Retorna o pool do processo para esta string de conexão, criando-o se preciso."""
+    with _pools_lock:
+        pool = _pools.get(conn_str)
+        if pool is None:
+            pool = _pools[conn_str] = ConnectionPool(conn_str, name=name)
+        return pool
+
+
+def pool_stats() -> dict:
+    """Estatísticas de todos os pools, indexadas pelo nome do banco."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
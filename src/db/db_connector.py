@@ -1,7 +1,10 @@
 import os
+import threading
 import pyodbc
 from dotenv import load_dotenv
 
+from src.db.connection_pool import get_pool, is_connection_error, pool_stats
+
 
 class Db_Connection:
     def __init__(self, db_name: str = None):
@@ -26,16 +29,34 @@ class Db_Connection:
             f"PWD={password};"
             "TrustServerCertificate=yes;"
         )
-        self.connection = None
+        self.pool = get_pool(self.conn_str, name=database)
+        # Conexões em uso por thread, para que a mesma instância possa ser usada
+        # em várias threads (e aninhada) sem uma sobrescrever a outra.
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
 
     def __enter__(self):
         try:
-            self.connection = pyodbc.connect(self.conn_str)
-            return self.connection
+            connection = self.pool.acquire()
         except pyodbc.Error as ex:
             print(f"Erro ao conectar ao banco de dados: {ex}")
             raise
 
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        self._local.stack.append(connection)
+        return connection
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.connection:
-            self.connection.close()
+        connection = self._local.stack.pop()
+        discard = exc_val is not None and is_connection_error(exc_val)
+        self.pool.release(connection, discard=discard)
+
+    @staticmethod
+    def pool_stats() -> dict:
+        """Estatísticas dos pools de conexão (tempo de espera, checkouts, misses...)."""
+        return pool_stats()
@@ -1,57 +1,197 @@
 import os
-import json
+import time
+import threading
 import pyodbc
 from src.db.db_connector import Db_Connection
+from src.db.result_formatter import (
+    LIVE_RESULT_MAX_ROWS,
+    format_rows,
+    summarize_status,
+    to_compact_json,
+)
 from dotenv import load_dotenv
 
+load_dotenv()
+
+LIVE_DATA_TTL = float(os.getenv("LIVE_DATA_TTL", "15"))
+# Coluna que identifica uma linha dentro da mesma máquina (usada ao aplicar deltas).
+LIVE_STATUS_ID_COLUMN = os.getenv("LIVE_STATUS_ID_COLUMN", "machine_name")
+
+
+class LiveSnapshot:
+    """
+    Foto em memória de uma tabela de status, indexada pelo nome da máquina.
+    É recarregada quando passa da janela de validade (ttl); se várias threads
+    pedirem ao mesmo tempo, só uma vai ao banco e as outras usam o resultado.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        ttl: float = LIVE_DATA_TTL,
+        key_column: str = "machine_name",
+        id_column: str = LIVE_STATUS_ID_COLUMN,
+    ):
+        self.table = table
+        self.ttl = ttl
+        self.key_column = key_column
+        self.id_column = id_column
+        self.rows_by_machine = {}
+        self.loaded_at = None
+        self._refresh_lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def _machine_key(self, data: dict) -> str:
+        return str(data.get(self.key_column) or "").strip()
+
+    def group_rows(self, columns: list, rows) -> dict:
+        rows_by_machine = {}
+        for row in rows:
+            data = dict(zip(columns, row))
+            rows_by_machine.setdefault(self._machine_key(data), []).append(data)
+        return rows_by_machine
+
+    def _load(self) -> dict:
+        with Db_Connection(db_name=os.getenv("DB_NAME_CONVERSATION")) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT * FROM {self.table}")
+                columns = [column[0] for column in cursor.description]
+                return self.group_rows(columns, cursor.fetchall())
+
+    def replace(self, rows_by_machine: dict):
+        """Troca a foto inteira (carga completa feita por fora, ex.: LiveStatusFeed)."""
+        with self._refresh_lock:
+            self.rows_by_machine = rows_by_machine
+            self.loaded_at = time.monotonic()
+
+    def apply_changes(self, changed_rows: list):
+        """
+        Aplica linhas alteradas (dicts) sobre a foto atual. A linha substitui a de
+        mesmo id_column da máquina, ou é acrescentada. A foto é copiada antes de
+        alterar (copy-on-write), então leitores nunca veem um dict pela metade.
+        """
+        with self._refresh_lock:
+            rows_by_machine = dict(self.rows_by_machine)
+            copied = set()
+
+            for data in changed_rows:
+                key = self._machine_key(data)
+                if key not in copied:
+                    rows_by_machine[key] = list(rows_by_machine.get(key, []))
+                    copied.add(key)
+
+                machine_rows = rows_by_machine[key]
+                row_id = data.get(self.id_column)
+                for i, existing in enumerate(machine_rows):
+                    if existing.get(self.id_column) == row_id:
+                        machine_rows[i] = data
+                        break
+                else:
+                    machine_rows.append(data)
+
+            self.rows_by_machine = rows_by_machine
+            self.loaded_at = time.monotonic()
+
+    def rows(self) -> dict:
+        """Retorna {nome da máquina: [linhas]}, recarregando se estiver vencido."""
+        if self._is_fresh():
+            return self.rows_by_machine
+
+        with self._refresh_lock:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock.
+            if self._is_fresh():
+                return self.rows_by_machine
+
+            try:
+                self.rows_by_machine = self._load()
+                self.loaded_at = time.monotonic()
+            except pyodbc.Error:
+                if self.loaded_at is None:
+                    raise
+                print(
+                    f"AVISO: falha ao atualizar '{self.table}'. Usando dados de "
+                    f"{time.monotonic() - self.loaded_at:.0f}s atrás."
+                )
+
+            return self.rows_by_machine
+
+    def lookup(self, canonical_name: str) -> list:
+        """Linhas da máquina: busca exata e, se não houver, por trecho do nome (como o LIKE)."""
+        rows_by_machine = self.rows()
+        key = canonical_name.strip()
+
+        if key in rows_by_machine:
+            return rows_by_machine[key]
+
+        for machine_name, rows in rows_by_machine.items():
+            if key in machine_name:
+                return rows
+
+        return []
+
 
 class LiveData:
     """
     Class to handle live data operations.
     """
 
-    def execute_query_machine(query: str, canonical_equipment_name: str):
-        """Conecta ao DB, executa uma query com o nome de um equipamento e retorna os resultados."""
-
-        load_dotenv()
+    machines = LiveSnapshot("machines_status")
+    products = LiveSnapshot("products_status")
+
+    def get_general_status(
+        mode: str = "resumo",
+        columns: list = None,
+        offset: int = 0,
+        limit: int = LIVE_RESULT_MAX_ROWS,
+    ) -> str:
+        """
+        Status de todas as máquinas e produtos, montado a partir das fotos em memória.
+        mode="resumo": contagem por status e lista das máquinas paradas.
+        mode="detalhado": linhas paginadas (offset/limit), com projeção de colunas.
+        """
 
         try:
-            with Db_Connection(db_name=os.getenv("DB_NAME_CONVERSATION")) as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(query, f"%{canonical_equipment_name}%")
-                    columns = [column[0] for column in cursor.description]
-                    row = cursor.fetchone()
+            machines = LiveData.machines.rows()
+            products = LiveData.products.rows()
+        except pyodbc.Error as db_err:
+            return f"Ocorreu um erro de banco de dados: {db_err}"
 
-                    if not row:
-                        return f"Nada encontrado para a máquina com nome parecido com '{canonical_equipment_name}'."
+        if mode != "detalhado":
+            return summarize_status(
+                [row for machine_rows in machines.values() for row in machine_rows]
+            )
 
-                    data = dict(zip(columns, row))
+        # Equivale ao JOIN products_status x machines_status por machine_name.
+        data = [
+            {**product, **machine}
+            for machine_name, product_rows in products.items()
+            for product in product_rows
+            for machine in machines.get(machine_name, [])
+        ]
 
-                    return json.dumps(data, ensure_ascii=False, indent=2)
+        # Ordem estável entre páginas.
+        data.sort(key=lambda row: str(row.get("machine_name")))
+        return format_rows(data, columns=columns, offset=offset, limit=limit)
 
+    def _get_status(snapshot: LiveSnapshot, canonical_equipment_name: str) -> str:
+        try:
+            rows = snapshot.lookup(canonical_equipment_name)
         except pyodbc.Error as db_err:
             return f"Ocorreu um erro de banco de dados: {db_err}"
 
-    def execute_query(query: str):
-        """Conecta ao DB, executa uma query e retorna os resultados."""
-
-        load_dotenv()
+        if not rows:
+            return f"Nada encontrado para a máquina com nome parecido com '{canonical_equipment_name}'."
 
-        try:
-            db_manager = Db_Connection(db_name=os.getenv("DB_NAME_CONVERSATION"))
-
-            with db_manager as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(query)
-                    columns = [column[0] for column in cursor.description]
-                    rows = cursor.fetchall()
+        return to_compact_json(rows[0])
 
-                    if not rows:
-                        return "Nenhum dado encontrado."
+    def get_machine_status(canonical_equipment_name: str) -> str:
+        """Status em tempo real de uma máquina, pelo nome canônico."""
 
-                    data = [dict(zip(columns, row)) for row in rows]
+        return LiveData._get_status(LiveData.machines, canonical_equipment_name)
 
-                    return json.dumps(data, ensure_ascii=False, indent=2)
+    def get_product_status(canonical_equipment_name: str) -> str:
+        """Status em tempo real do produto de uma máquina, pelo nome canônico."""
 
-        except pyodbc.Error as db_err:
-            return f"Ocorreu um erro de banco de dados: {db_err}"
+        return LiveData._get_status(LiveData.products, canonical_equipment_name)
@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import nullcontext
+
+from dotenv import load_dotenv
+
+from src.db.db_connector import Db_Connection
+from src.db.get_live_data import LiveData, LiveSnapshot
+
+load_dotenv()
+
+LIVE_STATUS_POLL_INTERVAL = float(os.getenv("LIVE_STATUS_POLL_INTERVAL", "2"))
+LIVE_STATUS_RESYNC_INTERVAL = float(os.getenv("LIVE_STATUS_RESYNC_INTERVAL", "600"))
+# Coluna crescente a cada alteração: rowversion no SQL Server ou um updated_at.
+LIVE_STATUS_WATERMARK_COLUMN = os.getenv("LIVE_STATUS_WATERMARK_COLUMN", "updated_at")
+
+
+def default_connect():
+    return Db_Connection(db_name=os.getenv("DB_NAME_CONVERSATION"))
+
+
+class LiveStatusFeed:
+    """
+    Serviço em segundo plano que mantém as fotos do LiveData atualizadas por
+    polling incremental: a cada intervalo busca só as linhas com watermark maior
+    ou igual ao último visto e aplica em memória. Assim o banco recebe uma
+    consulta pequena por intervalo, independente de quantas perguntas chegam.
+
+    Linhas apagadas não aparecem no delta; por isso uma carga completa é refeita
+    a cada resync_interval.
+    """
+
+    def __init__(
+        self,
+        connect=default_connect,
+        snapshots: list = None,
+        watermark_column: str = LIVE_STATUS_WATERMARK_COLUMN,
+        interval: float = LIVE_STATUS_POLL_INTERVAL,
+        resync_interval: float = LIVE_STATUS_RESYNC_INTERVAL,
+    ):
+        self.connect = connect
+        self.snapshots = snapshots or [LiveData.machines, LiveData.products]
+        self.watermark_column = watermark_column
+        self.interval = interval
+        self.resync_interval = resync_interval
+        self.watermarks = {}
+        self._last_resync = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _query(self, sql: str, params: tuple = ()):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            try:
+                if params:
+                    cursor.execute(sql, params)
+                else:
+                    cursor.execute(sql)
+                columns = [column[0] for column in cursor.description]
+                return columns, cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _update_watermark(self, snapshot: LiveSnapshot, columns: list, rows):
+        index = columns.index(self.watermark_column)
+        values = [row[index] for row in rows if row[index] is not None]
+        if values:
+            current = self.watermarks.get(snapshot.table)
+            newest = max(values)
+            self.watermarks[snapshot.table] = (
+                newest if current is None else max(current, newest)
+            )
+
+    def _full_load(self, snapshot: LiveSnapshot):
+        columns, rows = self._query(f"SELECT * FROM {snapshot.table}")
+        snapshot.replace(snapshot.group_rows(columns, rows))
+        self.watermarks.pop(snapshot.table, None)
+        self._update_watermark(snapshot, columns, rows)
+        self._last_resync[snapshot.table] = time.monotonic()
+        return len(rows)
+
+    def _delta_load(self, snapshot: LiveSnapshot):
+        # ">=" em vez de ">": linhas gravadas com o mesmo watermark depois da
+        # última leitura não se perdem; reaplicar uma linha não tem efeito.
+        columns, rows = self._query(
+            f"SELECT * FROM {snapshot.table} WHERE {self.watermark_column} >= ?",
+            (self.watermarks[snapshot.table],),
+        )
+        snapshot.apply_changes([dict(zip(columns, row)) for row in rows])
+        self._update_watermark(snapshot, columns, rows)
+        return len(rows)
+
+    def poll_once(self) -> dict:
+        """Faz uma rodada de polling em todas as tabelas. Retorna linhas lidas por tabela."""
+        applied = {}
+        now = time.monotonic()
+
+        for snapshot in self.snapshots:
+            needs_resync = (
+                snapshot.table not in self.watermarks
+                or now - self._last_resync.get(snapshot.table, 0) >= self.resync_interval
+            )
+            if needs_resync:
+                applied[snapshot.table] = self._full_load(snapshot)
+            else:
+                applied[snapshot.table] = self._delta_load(snapshot)
+
+        return applied
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"   [!] ERRO no polling de status ao vivo: {e}")
+                traceback.print_exc()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="live-status-feed", daemon=True
+        )
+        self._thread.start()
+        print(
+            f"Feed de status ao vivo iniciado (intervalo={self.interval}s, "
+            f"watermark='{self.watermark_column}')."
+        )
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def create_sqlite_stand_in(path: str = ":memory:"):
+    """
+    Banco SQLite com as tabelas machines_status e products_status, para testar o
+    feed sem SQL Server. Retorna (conexão, connect) onde connect pode ser passado
+    ao LiveStatusFeed.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS machines_status (
+            machine_name TEXT PRIMARY KEY,
+            status TEXT,
+            updated_at INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS products_status (
+            machine_name TEXT PRIMARY KEY,
+            product TEXT,
+            updated_at INTEGER NOT NULL
+        );
+        """
+    )
+    return conn, lambda: nullcontext(conn)
+
+
+if __name__ == "__main__":
+    conn, connect = create_sqlite_stand_in()
+    conn.executemany(
+        "INSERT INTO machines_status VALUES (?, ?, ?)",
+        [("TEAR 01", "Rodando", 1), ("TEAR 02", "Parada", 1)],
+    )
+    conn.execute("INSERT INTO products_status VALUES ('TEAR 01', 'Feltro A', 1)")
+    conn.commit()
+
+    machines = LiveSnapshot("machines_status", ttl=3600)
+    products = LiveSnapshot("products_status", ttl=3600)
+    feed = LiveStatusFeed(connect=connect, snapshots=[machines, products])
+
+    print("Carga inicial:", feed.poll_once())
+
+    conn.execute(
+        "UPDATE machines_status SET status = 'Rodando', updated_at = 2 WHERE machine_name = 'TEAR 02'"
+    )
+    conn.commit()
+
+    print("Delta:", feed.poll_once())
+    print("TEAR 02:", machines.lookup("TEAR 02"))
@@ -0,0 +1,100 @@
+import os
+import json
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LIVE_RESULT_MAX_ROWS = int(os.getenv("LIVE_RESULT_MAX_ROWS", "50"))
+LIVE_STATUS_COLUMN = os.getenv("LIVE_STATUS_COLUMN", "status")
+LIVE_STOPPED_STATUSES = {
+    value.strip().lower()
+    for value in os.getenv(
+        "LIVE_STOPPED_STATUSES", "parada,parado,stopped,desligada,desligado"
+    ).split(",")
+    if value.strip()
+}
+
+"""
+Serialização compacta dos resultados de status para o LLM: JSON sem indentação,
+colunas listadas uma vez só, limite de linhas por página e um modo de resumo.
+"""
+
+
+def to_compact_json(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def format_rows(
+    rows: list,
+    columns: list = None,
+    offset: int = 0,
+    limit: int = LIVE_RESULT_MAX_ROWS,
+) -> str:
+    """
+    Formata linhas (dicts) em tabela compacta paginada:
+    {"colunas": [...], "linhas": [[...], ...], "total": N, "proximo_offset": M | null}.
+    """
+    if not rows:
+        return "Nenhum dado encontrado."
+
+    available = list(rows[0].keys())
+    if columns:
+        unknown = [column for column in columns if column not in available]
+        if unknown:
+            return (
+                f"Colunas inexistentes: {unknown}. Colunas disponíveis: {available}."
+            )
+    else:
+        columns = available
+
+    offset = max(0, offset)
+    page = rows[offset : offset + limit]
+    next_offset = offset + limit if offset + limit < len(rows) else None
+
+    return to_compact_json(
+        {
+            "colunas": columns,
+            "linhas": [[row.get(column) for column in columns] for row in page],
+            "total": len(rows),
+            "offset": offset,
+            "proximo_offset": next_offset,
+        }
+    )
+
+
+def summarize_status(
+    rows: list,
+    name_column: str = "machine_name",
+    status_column: str = LIVE_STATUS_COLUMN,
+) -> str:
+    """Resumo: quantidade de máquinas por status e a lista das paradas."""
+    if not rows:
+        return "Nenhum dado encontrado."
+
+    if status_column not in rows[0]:
+        return to_compact_json(
+            {
+                "total": len(rows),
+                "aviso": f"Coluna de status '{status_column}' não encontrada.",
+                "colunas": list(rows[0].keys()),
+            }
+        )
+
+    counts = Counter(str(row.get(status_column)) for row in rows)
+    stopped = sorted(
+        {
+            str(row.get(name_column))
+            for row in rows
+            if str(row.get(status_column) or "").strip().lower() in LIVE_STOPPED_STATUSES
+        }
+    )
+
+    return to_compact_json(
+        {
+            "total": len(rows),
+            "por_status": dict(counts.most_common()),
+            "paradas": stopped,
+        }
+    )
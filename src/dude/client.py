@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DUDE_POOL_SIZE = int(os.getenv("DUDE_POOL_SIZE", "8"))
+DUDE_TIMEOUT = float(os.getenv("DUDE_TIMEOUT", "30"))
+DUDE_MAX_RETRIES = int(os.getenv("DUDE_MAX_RETRIES", "3"))
+DUDE_BACKOFF_FACTOR = float(os.getenv("DUDE_BACKOFF_FACTOR", "0.5"))
+# Validade pedida no login. Tratada como segundos, o que no pior caso só faz o
+# token ser renovado antes do necessário.
+DUDE_TOKEN_EXPIRY = int(os.getenv("DUDE_TOKEN_EXPIRY", "120"))
+# Renova o token esta quantidade de segundos antes de ele expirar.
+DUDE_TOKEN_REFRESH_MARGIN = float(os.getenv("DUDE_TOKEN_REFRESH_MARGIN", "20"))
+
+"""
+Cliente do Dude compartilhado pelo processo: uma requests.Session com pool de
+conexões keep-alive (sem novo handshake TCP/TLS a cada página), retry com
+backoff para erros transitórios e um token de login reaproveitado entre as
+consultas, renovado pouco antes de expirar ou quando a API responde 401.
+"""
+
+
+class DudeClient:
+    def __init__(
+        self,
+        url: str = None,
+        username: str = None,
+        password: str = None,
+        culture: str = "pt-BR",
+        token_expiry: int = DUDE_TOKEN_EXPIRY,
+        pool_size: int = DUDE_POOL_SIZE,
+        timeout: float = DUDE_TIMEOUT,
+    ):
+        self.url = url or os.getenv("DUDE_API")
+        self.username = username or os.getenv("DUDE_USER")
+        self.password = password or os.getenv("DUDE_PASSWORD")
+        self.culture = culture
+        self.token_expiry = token_expiry
+        self.timeout = timeout
+
+        # A busca de ordens é uma leitura, então o POST também pode ser repetido.
+        retry = Retry(
+            total=DUDE_MAX_RETRIES,
+            backoff_factor=DUDE_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self.logins = 0
+
+    def _login(self) -> str:
+        login_data = {
+            "loginName": self.username,
+            "Password": self.password,
+            "cultureCode": self.culture,
+            "Expires": self.token_expiry,
+        }
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        resp = self.session.post(
+            f"{self.url}/login",
+            data=urlencode(login_data),
+            headers=headers,
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        self.logins += 1
+        return resp.text
+
+    def token(self, force_refresh: bool = False) -> str:
+        """Token válido, fazendo login só se não houver um ou se estiver para expirar."""
+        with self._token_lock:
+            now = time.monotonic()
+            if force_refresh or self._token is None or now >= self._token_expires_at:
+                self._token = self._login()
+                self._token_expires_at = (
+                    now + max(self.token_expiry - DUDE_TOKEN_REFRESH_MARGIN, 0)
+                )
+            return self._token
+
+    def invalidate_token(self, token: str):
+        with self._token_lock:
+            # Outra thread pode já ter renovado; só descarta o token que falhou.
+            if self._token == token:
+                self._token = None
+
+    def post(self, endpoint: str, payload: dict) -> dict:
+        for attempt in range(2):
+            token = self.token()
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Basic {token}",
+            }
+            resp = self.session.post(
+                f"{self.url}/{endpoint}", json=payload, headers=headers, timeout=self.timeout
+            )
+            # 401: token expirado ou revogado no servidor; faz login de novo uma vez.
+            if resp.status_code == 401 and attempt == 0:
+                self.invalidate_token(token)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_dude_client() -> DudeClient:
+    """Retorna o DudeClient do processo, criando-o na primeira chamada."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DudeClient()
+
+    return _client
@@ -1,19 +1,25 @@
-import requests
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from urllib.parse import urlencode
 from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
 
+from src.dude.client import DudeClient, get_dude_client
+
+load_dotenv()
+
+DUDE_PAGE_SIZE = int(os.getenv("DUDE_PAGE_SIZE", "200"))
+# Páginas de workorders/searches buscadas em paralelo após a primeira.
+DUDE_PAGE_CONCURRENCY = int(os.getenv("DUDE_PAGE_CONCURRENCY", "4"))
+
 
 class DudeConnectionBase:
-    def __init__(self):
-        load_dotenv()
-        self.url = os.getenv("DUDE_API")
-        self.username = os.getenv("DUDE_USER")
-        self.password = os.getenv("DUDE_PASSWORD")
-        self.culture = "pt-BR"
-        self.token_expiry = 120
+    def __init__(self, client: DudeClient = None, page_concurrency: int = DUDE_PAGE_CONCURRENCY):
+        # Sessão e token são do processo: cada consulta reaproveita as conexões
+        # abertas e o login ainda válido.
+        self.client = client or get_dude_client()
+        self.page_concurrency = max(1, page_concurrency)
 
     def get_current_date(self) -> str:
         now = datetime.now(timezone.utc)
@@ -23,66 +29,77 @@ class DudeConnectionBase:
         now = datetime.now(timezone.utc)
         return now.strftime("%Y-%m-%dT%H:%M:%S")
 
-    def _get_token(self, endpoint: str) -> str:
-        login_data = {
-            "loginName": self.username,
-            "Password": self.password,
-            "cultureCode": self.culture,
-            "Expires": self.token_expiry,
+    def _search_payload(
+        self, city: str, start_date: str, end_date: str, page: int, modified_since: str = None
+    ) -> dict:
+        payload = {
+            "Options": {
+                "PopulateCustomFields": True,
+                "PopulateMedium": True,
+                "PopulateSource": True,
+                "PopulateParentPaths": True,
+                "ParentPathDelimiter": "--",
+                "TotalItems": 0,
+                "TotalObjectCountOption": "TotalObjectCount",
+            },
+            "Page": {"PageNumber": page, "PageSize": DUDE_PAGE_SIZE},
+            "City": {"Filters": [{"Value": city, "MatchType": "Equals"}]},
         }
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        resp = requests.post(
-            f"{self.url}/{endpoint}", data=urlencode(login_data), headers=headers
+        if start_date:
+            payload["DateCreated"] = {"StartValue": start_date, "EndValue": end_date}
+        if modified_since:
+            # Só o que mudou desde o último watermark (usado pelo espelho local).
+            payload["DateLastModified"] = {"StartValue": modified_since, "EndValue": end_date}
+        return payload
+
+    def _fetch_page(
+        self, city: str, start_date: str, end_date: str, page: int, modified_since: str = None
+    ) -> dict:
+        return self.client.post(
+            "workorders/searches",
+            self._search_payload(city, start_date, end_date, page, modified_since),
         )
-        resp.raise_for_status()
-
-        return resp.text
-
-    def _search_info(self, token: str, city: str, start_date: str, end_date: str):
-        search_url = f"{self.url}/workorders/searches"
-        all_orders = []
-        page = 1
-        total_pages = 1
 
+    def iter_orders(
+        self, city: str, start_date: str, end_date: str, modified_since: str = None
+    ):
+        """
+        Ordens na ordem das páginas, entregues assim que cada página chega. A
+        primeira página informa TotalPages; as demais são buscadas em paralelo,
+        com no máximo page_concurrency requisições abertas ao mesmo tempo.
+        """
         if start_date == "vazio":
             date = datetime.fromisoformat(self.get_current_date())
             start_date = date - relativedelta(months=1)
             start_date = start_date.isoformat()
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Basic {token}",
-        }
-
-        while page <= total_pages:
-            payload = {
-                "Options": {
-                    "PopulateCustomFields": True,
-                    "PopulateMedium": True,
-                    "PopulateSource": True,
-                    "PopulateParentPaths": True,
-                    "ParentPathDelimiter": "--",
-                    "TotalItems": 0,
-                    "TotalObjectCountOption": "TotalObjectCount",
-                },
-                "Page": {"PageNumber": page, "PageSize": 200},
-                "City": {"Filters": [{"Value": city, "MatchType": "Equals"}]},
-                "DateCreated": {"StartValue": start_date, "EndValue": end_date},
-            }
-            """ "DateLastModified": {
-                "StartValue": "start_date_modified",
-                "EndValue": "end_date_modified"
-            } """
-
-            resp = requests.post(search_url, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-
-            all_orders.extend(data.get("Items", []))
-            total_pages = data.get("TotalPages", 1)
-            page += 1
-
-        return all_orders
+        data = self._fetch_page(city, start_date, end_date, 1, modified_since)
+        yield from data.get("Items", [])
+
+        total_pages = data.get("TotalPages", 1)
+        if total_pages <= 1:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.page_concurrency)
+        pending = deque()
+        next_page = 2
+        try:
+            while pending or next_page <= total_pages:
+                # Janela limitada: não busca páginas muito à frente da que está
+                # sendo consumida.
+                while next_page <= total_pages and len(pending) < self.page_concurrency * 2:
+                    pending.append(
+                        executor.submit(
+                            self._fetch_page, city, start_date, end_date, next_page, modified_since
+                        )
+                    )
+                    next_page += 1
+                yield from pending.popleft().result().get("Items", [])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _search_info(self, city: str, start_date: str, end_date: str):
+        return list(self.iter_orders(city, start_date, end_date))
 
     def _filter(self, orders: list, status_filter: str) -> list:
         def should_include(o):
@@ -131,10 +148,10 @@ class DudeConnectionBase:
         return mapped
 
     def fetch_new_requests(self, city, start_date, status_filter):
-        token = self._get_token("login")
         end_date = self.date_formatted()
 
-        orders = self._search_info(token, city, start_date, end_date)
+        # O filtro consome as páginas conforme chegam.
+        orders = self.iter_orders(city, start_date, end_date)
         return self._filter(orders, status_filter)
 
 
@@ -0,0 +1,174 @@
+import json
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""
+Servidor HTTP falso do Dude, para testes e benchmarks sem a API real. Atende
+POST /login e POST /workorders/searches com paginação (Page, TotalPages) e os
+filtros City, DateCreated e DateLastModified, com latência configurável por
+requisição. Guarda contadores de logins, buscas e pico de requisições
+simultâneas.
+
+Uso: python -m src.dude.fake_dude_server  (compara busca sequencial e paralela)
+"""
+
+STATUSES = ["New Request", "In Progress", "Completed"]
+ASSETS = ["TEAR 01", "TEAR 02", "TEAR 03", "CLT-1", "CLT-2", "ISO 07"]
+
+
+def generate_orders(count: int, city: str = "Petropolis", days: int = 60, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    start = datetime(2025, 5, 1)
+    orders = []
+    for i in range(1, count + 1):
+        created = start + timedelta(minutes=rng.randrange(days * 24 * 60))
+        # A ordem pode ser aberta no Dude depois da data de origem informada.
+        originated = created - timedelta(minutes=rng.randrange(2 * 24 * 60))
+        modified = created + timedelta(minutes=rng.randrange(3 * 24 * 60))
+        orders.append(
+            {
+                "WorkOrderId": i,
+                "WorkOrderNo": f"{i:06d}",
+                "Name": f"Ordem {i} - manutenção corretiva",
+                "ProblemName": rng.choice(["Quebra", "Ruído", "Vazamento", "Ajuste"]),
+                "WorkCategoryName": rng.choice(["Corretiva", "Preventiva"]),
+                "SourceLocationName": rng.choice(["Tecelagem", "Acabamento"]),
+                "SourceAssetName": rng.choice(ASSETS),
+                "WOStatusName": rng.choice(STATUSES),
+                "DateCreated": created.isoformat(),
+                "DateOriginated": originated.isoformat(),
+                "WorkRequested": f"Verificar equipamento da ordem {i}",
+                "LastModifiedOn": modified.isoformat(),
+                "DateExpected": (created + timedelta(days=2)).isoformat(),
+                "City": city,
+            }
+        )
+    return orders
+
+
+def _in_range(value: str, date_range: dict) -> bool:
+    start, end = date_range.get("StartValue"), date_range.get("EndValue")
+    return (not start or value >= start) and (not end or value <= end)
+
+
+class FakeDudeServer:
+    def __init__(self, orders: list = None, latency: float = 0.05, port: int = 0):
+        self.orders = orders if orders is not None else generate_orders(2000)
+        self.latency = latency
+        self.logins = 0
+        self.searches = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._tokens = set()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency)
+                    code, content, content_type = server.handle(
+                        self.path, self.headers.get("Authorization", ""), body
+                    )
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def handle(self, path: str, authorization: str, body: bytes):
+        if path == "/login":
+            with self._lock:
+                self.logins += 1
+                token = f"token-{self.logins}"
+                self._tokens.add(token)
+            return 200, token.encode(), "text/plain"
+
+        if authorization.split(" ")[-1] not in self._tokens:
+            return 401, b"{}", "application/json"
+
+        if path != "/workorders/searches":
+            return 404, b"{}", "application/json"
+
+        with self._lock:
+            self.searches += 1
+        payload = json.loads(body)
+        cities = {f["Value"] for f in payload.get("City", {}).get("Filters", [])}
+        matched = [
+            order
+            for order in self.orders
+            if (not cities or order["City"] in cities)
+            and _in_range(order["DateCreated"], payload.get("DateCreated", {}))
+            and _in_range(order["LastModifiedOn"], payload.get("DateLastModified", {}))
+        ]
+
+        page = payload.get("Page", {})
+        number, size = page.get("PageNumber", 1), page.get("PageSize", 200)
+        items = matched[(number - 1) * size : number * size]
+        content = {
+            "Items": items,
+            "TotalItems": len(matched),
+            "TotalPages": max(1, -(-len(matched) // size)),
+        }
+        return 200, json.dumps(content).encode(), "application/json"
+
+    def revoke_tokens(self):
+        with self._lock:
+            self._tokens.clear()
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from src.dude.client import DudeClient
+    from src.dude.controller import DudeConnectionBase
+
+    with FakeDudeServer(generate_orders(3000), latency=0.15) as server:
+        client = DudeClient(url=server.url, username="bot", password="senha")
+        results = {}
+        for concurrency in (1, 4, 8):
+            connection = DudeConnectionBase(client, page_concurrency=concurrency)
+            server.max_in_flight = 0
+            started = time.perf_counter()
+            orders = connection._search_info("Petropolis", "2025-05-01T00:00:00", "2025-07-01T00:00:00")
+            elapsed = time.perf_counter() - started
+            results[concurrency] = [order["WorkOrderNo"] for order in orders]
+            print(
+                f"Concorrência {concurrency}: {len(orders)} ordens em {elapsed:.2f}s "
+                f"(pico de {server.max_in_flight} requisições simultâneas)"
+            )
+
+        print("Mesma ordem em todas as execuções:", len({tuple(r) for r in results.values()}) == 1)
+        print(f"Logins: {server.logins}, buscas: {server.searches}")
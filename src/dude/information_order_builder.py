@@ -1,4 +1,5 @@
 from src.dude.controller import DudeConnectionBase
+from src.dude.work_order_mirror import get_work_order_mirror
 
 """ 
     Filtrar por:
@@ -19,9 +20,30 @@ class InformationOrderBuilder:
         self.data = data
         self.status = status
 
+    def _fetch(self, city: str) -> list:
+        """Lê do espelho local quando ele cobre a consulta; senão, da API do Dude."""
+        mirror = get_work_order_mirror()
+        if mirror is not None:
+            ordens = mirror.fetch_new_requests(city, self.data, self.status)
+            if ordens is not None:
+                return ordens
+
+        try:
+            return DudeConnectionBase().fetch_new_requests(city, self.data, self.status)
+        except Exception as e:
+            # Dude fora do ar: responde com o que o espelho tiver, mesmo desatualizado.
+            ordens = (
+                mirror.fetch_new_requests(city, self.data, self.status, allow_stale=True)
+                if mirror is not None
+                else None
+            )
+            if ordens is None:
+                raise
+            print(f"AVISO: API do Dude indisponível, usando o espelho local. Erro: {e}")
+            return ordens
+
     def getOrderBy(self):
-        controller = DudeConnectionBase()
-        ordens = controller.fetch_new_requests("Petropolis", self.data, self.status)
+        ordens = self._fetch("Petropolis")
         orders = []
 
         for ordem in ordens:
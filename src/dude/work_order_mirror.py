@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from dateutil.relativedelta import relativedelta
+from dotenv import load_dotenv
+
+from src.dude.controller import DudeConnectionBase
+
+load_dotenv()
+
+DUDE_MIRROR_ENABLED = os.getenv("DUDE_MIRROR", "false").lower() == "true"
+DUDE_MIRROR_PATH = os.getenv(
+    "DUDE_MIRROR_PATH", os.path.join(os.path.dirname(__file__), "work_orders.sqlite3")
+)
+DUDE_MIRROR_CITY = os.getenv("DUDE_MIRROR_CITY", "Petropolis")
+DUDE_MIRROR_SYNC_INTERVAL = float(os.getenv("DUDE_MIRROR_SYNC_INTERVAL", "60"))
+# Janela de DateCreated trazida na carga completa; consultas anteriores a ela vão à API.
+DUDE_MIRROR_BACKFILL_MONTHS = int(os.getenv("DUDE_MIRROR_BACKFILL_MONTHS", "3"))
+DUDE_MIRROR_RESYNC_INTERVAL = float(os.getenv("DUDE_MIRROR_RESYNC_INTERVAL", str(24 * 60 * 60)))
+# Recuo do watermark a cada delta, para não perder ordens gravadas com atraso.
+DUDE_MIRROR_OVERLAP = float(os.getenv("DUDE_MIRROR_OVERLAP", "300"))
+# Acima disso o espelho só é usado se a API estiver fora.
+DUDE_MIRROR_MAX_STALENESS = float(os.getenv("DUDE_MIRROR_MAX_STALENESS", "600"))
+# Validade (s) da vez de sincronizar: com vários processos no mesmo arquivo (shards),
+# só o dono da vez sincroniza; se ele morrer, outro assume quando ela expirar.
+DUDE_MIRROR_LEASE = float(os.getenv("DUDE_MIRROR_LEASE", "300"))
+# Campo da ordem usado pela busca remota (filtro DateCreated); o espelho indexa o mesmo.
+DUDE_CREATED_FIELD = "DateCreated"
+
+"""
+Espelho local (SQLite) das ordens de serviço do Dude. Um serviço em segundo
+plano faz uma carga completa da janela de DateCreated e, depois, a cada
+intervalo, busca só as ordens com DateLastModified a partir do último
+watermark. As perguntas sobre ordens de serviço viram consultas locais
+indexadas por status, ativo e data de criação, e continuam respondendo quando
+a API do Dude está fora.
+
+Ordens apagadas no Dude não aparecem no delta; por isso a carga completa é
+refeita a cada resync_interval. Todos os processos que usam o mesmo arquivo
+sobem o serviço, mas só o que detém a vez (tabela sync_lease) sincroniza.
+"""
+
+
+def normalize_date(value: str) -> str:
+    """
+    Datas do Dude e do agente ('YYYY-MM-DDThh-mm-ss') no formato comparável
+    'YYYY-MM-DDThh:mm:ss'. Datas com fuso são convertidas para UTC, o mesmo
+    referencial de covered_from; datas sem fuso são mantidas como vieram.
+    """
+    value = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc)
+        return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        date, _, time_part = value.partition("T")
+        return f"{date}T{time_part.replace('-', ':')}" if time_part else f"{date}T00:00:00"
+
+
+class WorkOrderMirror:
+    def __init__(
+        self,
+        path: str = DUDE_MIRROR_PATH,
+        connection: DudeConnectionBase = None,
+        city: str = DUDE_MIRROR_CITY,
+        interval: float = DUDE_MIRROR_SYNC_INTERVAL,
+        backfill_months: int = DUDE_MIRROR_BACKFILL_MONTHS,
+        resync_interval: float = DUDE_MIRROR_RESYNC_INTERVAL,
+        overlap: float = DUDE_MIRROR_OVERLAP,
+        max_staleness: float = DUDE_MIRROR_MAX_STALENESS,
+        lease: float = DUDE_MIRROR_LEASE,
+    ):
+        self.connection = connection
+        self.city = city
+        self.interval = interval
+        self.backfill_months = backfill_months
+        self.resync_interval = resync_interval
+        self.overlap = overlap
+        self.max_staleness = max_staleness
+        self.lease = max(lease, interval * 2)
+        self.owner = f"{os.getpid()}:{id(self)}"
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL com uma conexão só de leitura: as consultas continuam enquanto a
+        # sincronização grava, e não esperam pelo lock da escrita.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS work_orders (
+                work_order_no TEXT PRIMARY KEY,
+                city TEXT NOT NULL,
+                status TEXT,
+                asset TEXT,
+                created_at TEXT NOT NULL,
+                modified_at TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_work_orders_created ON work_orders (city, created_at);
+            CREATE INDEX IF NOT EXISTS ix_work_orders_status
+                ON work_orders (city, status, created_at);
+            CREATE INDEX IF NOT EXISTS ix_work_orders_asset
+                ON work_orders (city, asset, created_at);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                city TEXT PRIMARY KEY,
+                covered_from TEXT NOT NULL,
+                watermark TEXT,
+                last_full_sync REAL NOT NULL,
+                last_sync REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sync_lease (
+                city TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+        self.read_conn = sqlite3.connect(path, check_same_thread=False)
+
+    def _get_connection(self) -> DudeConnectionBase:
+        if self.connection is None:
+            self.connection = DudeConnectionBase()
+        return self.connection
+
+    # Sincronização
+
+    def _state(self):
+        with self._read_lock:
+            row = self.read_conn.execute(
+                "SELECT covered_from, watermark, last_full_sync, last_sync "
+                "FROM sync_state WHERE city = ?",
+                (self.city,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("covered_from", "watermark", "last_full_sync", "last_sync"), row))
+
+    def _upsert(self, orders) -> tuple:
+        """Grava as ordens; retorna (quantidade, maior LastModifiedOn visto, números gravados)."""
+        rows, numbers, newest, skipped = [], [], None, 0
+        for order in orders:
+            number = order.get("WorkOrderNo")
+            created = order.get(DUDE_CREATED_FIELD)
+            if not number or not created:
+                skipped += 1
+                continue
+            modified = normalize_date(order["LastModifiedOn"]) if order.get("LastModifiedOn") else None
+            if modified and (newest is None or modified > newest):
+                newest = modified
+            numbers.append(str(number))
+            rows.append(
+                (
+                    str(number),
+                    self.city,
+                    order.get("WOStatusName"),
+                    order.get("SourceAssetName"),
+                    normalize_date(created),
+                    modified,
+                    json.dumps(order, ensure_ascii=False, default=str),
+                )
+            )
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO work_orders "
+                "(work_order_no, city, status, asset, created_at, modified_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        if skipped:
+            print(f"   [!] {skipped} ordens do Dude sem WorkOrderNo ou {DUDE_CREATED_FIELD} ignoradas.")
+        return len(rows), newest, numbers
+
+    def _full_sync(self) -> int:
+        connection = self._get_connection()
+        now = datetime.now(timezone.utc)
+        covered_from = (now - relativedelta(months=self.backfill_months)).strftime(
+            "%Y-%m-%dT00:00:00"
+        )
+        orders = connection.iter_orders(self.city, covered_from, connection.date_formatted())
+        count, newest, numbers = self._upsert(orders)
+
+        with self._lock, self.conn:
+            # Ordens da janela que não vieram na carga completa foram apagadas no Dude.
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (work_order_no TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM seen")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen VALUES (?)", [(n,) for n in numbers]
+            )
+            self.conn.execute(
+                "DELETE FROM work_orders WHERE city = ? AND created_at >= ? "
+                "AND work_order_no NOT IN (SELECT work_order_no FROM seen)",
+                (self.city, covered_from),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state "
+                "(city, covered_from, watermark, last_full_sync, last_sync) VALUES (?, ?, ?, ?, ?)",
+                (self.city, covered_from, newest or covered_from, time.time(), time.time()),
+            )
+        return count
+
+    def _delta_sync(self, state: dict) -> int:
+        connection = self._get_connection()
+        since = datetime.fromisoformat(state["watermark"]) - timedelta(seconds=self.overlap)
+        orders = connection.iter_orders(
+            self.city,
+            None,
+            connection.date_formatted(),
+            modified_since=since.strftime("%Y-%m-%dT%H:%M:%S"),
+        )
+        count, newest, _ = self._upsert(orders)
+
+        watermark = max(state["watermark"], newest) if newest else state["watermark"]
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE sync_state SET watermark = ?, last_sync = ? WHERE city = ?",
+                (watermark, time.time(), self.city),
+            )
+        return count
+
+    def sync_once(self) -> int:
+        """Uma rodada de sincronização. Retorna quantas ordens foram gravadas."""
+        state = self._state()
+        if state is None or time.time() - state["last_full_sync"] >= self.resync_interval:
+            return self._full_sync()
+        return self._delta_sync(state)
+
+    def _acquire_lease(self) -> bool:
+        """Pega ou renova a vez de sincronizar; False se outro processo a detém."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO sync_lease (city, owner, expires_at) VALUES (?, ?, 0)",
+                (self.city, self.owner),
+            )
+            cursor = self.conn.execute(
+                "UPDATE sync_lease SET owner = ?, expires_at = ? "
+                "WHERE city = ? AND (owner = ? OR expires_at < ?)",
+                (self.owner, now + self.lease, self.city, self.owner, now),
+            )
+        return cursor.rowcount == 1
+
+    def _release_lease(self):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE sync_lease SET expires_at = 0 WHERE city = ? AND owner = ?",
+                (self.city, self.owner),
+            )
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._acquire_lease():
+                    self.sync_once()
+            except Exception as e:
+                print(f"   [!] ERRO na sincronização das ordens do Dude: {e}")
+                traceback.print_exc()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="dude-work-order-mirror", daemon=True
+        )
+        self._thread.start()
+        print(
+            f"Espelho de ordens do Dude iniciado (cidade='{self.city}', "
+            f"intervalo={self.interval}s)."
+        )
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._release_lease()
+
+    # Consulta
+
+    def covers(self, city: str, start_date: str, allow_stale: bool = False) -> bool:
+        """O espelho tem todas as ordens pedidas (e está atualizado o bastante)?"""
+        state = self._state()
+        if city != self.city or state is None:
+            return False
+        if normalize_date(start_date) < state["covered_from"]:
+            return False
+        return allow_stale or time.time() - state["last_sync"] <= self.max_staleness
+
+    def query(
+        self,
+        start_date: str,
+        end_date: str = None,
+        status: str = None,
+        asset: str = None,
+    ) -> list:
+        """
+        Ordens (no formato da API) criadas a partir de start_date, na ordem em que
+        a API as entrega (WorkOrderId). status casa por trecho, como o _filter.
+        """
+        sql = "SELECT data FROM work_orders WHERE city = ? AND created_at >= ?"
+        params = [self.city, normalize_date(start_date)]
+        if end_date:
+            sql += " AND created_at <= ?"
+            params.append(normalize_date(end_date))
+        if status:
+            # instr, e não LIKE: diferencia maiúsculas, como o "in" do _filter.
+            sql += " AND instr(status, ?) > 0"
+            params.append(status)
+        if asset:
+            sql += " AND asset = ?"
+            params.append(asset)
+        sql += " ORDER BY CAST(json_extract(data, '$.WorkOrderId') AS INTEGER), work_order_no"
+
+        with self._read_lock:
+            rows = self.read_conn.execute(sql, params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def fetch_new_requests(
+        self, city: str, start_date: str, status_filter: str, allow_stale: bool = False
+    ):
+        """
+        Mesmo resultado de DudeConnectionBase.fetch_new_requests, lido do
+        espelho. Retorna None se o espelho não cobre a consulta.
+        """
+        connection = self._get_connection()
+        if start_date == "vazio":
+            date = datetime.fromisoformat(connection.get_current_date())
+            start_date = (date - relativedelta(months=1)).isoformat()
+
+        if not self.covers(city, start_date, allow_stale):
+            return None
+
+        # Mesmo casamento por trecho do _filter ("Complete" traz "Completed"),
+        # que ainda aplica a regra original sobre o resultado.
+        status = None if status_filter.lower() == "vazio" else status_filter
+        orders = self.query(start_date, status=status)
+        return connection._filter(orders, status_filter)
+
+    def close(self):
+        self.stop()
+        self.read_conn.close()
+        self.conn.close()
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_work_order_mirror():
+    """Retorna o espelho do processo, ou None se DUDE_MIRROR não estiver ligado."""
+    global _mirror
+
+    if not DUDE_MIRROR_ENABLED:
+        return None
+
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = WorkOrderMirror()
+
+    return _mirror
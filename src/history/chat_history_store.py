@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage
+
+load_dotenv()
+
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "memory").lower()
+CHAT_HISTORY_MAX_USERS = int(os.getenv("CHAT_HISTORY_MAX_USERS", "5000"))
+CHAT_HISTORY_IDLE_TTL = int(os.getenv("CHAT_HISTORY_IDLE_TTL", str(6 * 60 * 60)))
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "3000"))
+CHAT_HISTORY_MAX_MESSAGE_TOKENS = int(
+    os.getenv("CHAT_HISTORY_MAX_MESSAGE_TOKENS", "800")
+)
+
+TRUNCATED_SUFFIX = " …[truncado]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token), suficiente para orçamento."""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[: max_tokens * 4] + TRUNCATED_SUFFIX
+
+
+class _UserHistory:
+    # Cada mensagem é guardada como (is_human, content, tokens): bem menor que
+    # um HumanMessage/AIMessage com todos os seus campos.
+    __slots__ = ("messages", "tokens", "last_seen")
+
+    def __init__(self):
+        self.messages = deque()
+        self.tokens = 0
+        self.last_seen = time.monotonic()
+
+
+class ChatHistoryStore:
+    """
+    Histórico de conversa em memória, limitado por usuário (orçamento de tokens)
+    e no total (LRU de usuários + expiração de usuários ociosos).
+    """
+
+    def __init__(
+        self,
+        max_users: int = CHAT_HISTORY_MAX_USERS,
+        idle_ttl: int = CHAT_HISTORY_IDLE_TTL,
+        max_tokens: int = CHAT_HISTORY_MAX_TOKENS,
+        max_message_tokens: int = CHAT_HISTORY_MAX_MESSAGE_TOKENS,
+    ):
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.max_tokens = max_tokens
+        self.max_message_tokens = max_message_tokens
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_users = 0
+
+    def _evict(self, now: float):
+        # O OrderedDict fica em ordem de último acesso: os ociosos estão no começo.
+        while self._users:
+            user_id, history = next(iter(self._users.items()))
+            if now - history.last_seen <= self.idle_ttl and len(self._users) <= self.max_users:
+                break
+            del self._users[user_id]
+            self.evicted_users += 1
+
+    def get_messages(self, user_id: str) -> list:
+        """Retorna o histórico do usuário como mensagens do LangChain."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            history = self._users.get(user_id)
+            if history is None:
+                return []
+
+            history.last_seen = now
+            self._users.move_to_end(user_id)
+            messages = list(history.messages)
+
+        return [
+            HumanMessage(content=content) if is_human else AIMessage(content=content)
+            for is_human, content, _ in messages
+        ]
+
+    def append_turn(self, user_id: str, user_message: str, bot_response: str):
+        """Adiciona uma pergunta e a resposta, descartando os turnos mais antigos
+        quando o orçamento de tokens do usuário é ultrapassado."""
+        user_message = truncate_to_tokens(user_message, self.max_message_tokens)
+        bot_response = truncate_to_tokens(bot_response, self.max_message_tokens)
+
+        now = time.monotonic()
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is None:
+                history = self._users[user_id] = _UserHistory()
+
+            for is_human, content in ((True, user_message), (False, bot_response)):
+                tokens = estimate_tokens(content)
+                history.messages.append((is_human, content, tokens))
+                history.tokens += tokens
+
+            # Remove sempre em pares (pergunta + resposta), mantendo o último turno.
+            while history.tokens > self.max_tokens and len(history.messages) > 2:
+                for _ in range(2):
+                    history.tokens -= history.messages.popleft()[2]
+
+            history.last_seen = now
+            self._users.move_to_end(user_id)
+            self._evict(now)
+
+    def clear(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> dict:
+        """Resumo de uso: usuários, mensagens, tokens e memória aproximada em bytes."""
+        with self._lock:
+            messages = sum(len(h.messages) for h in self._users.values())
+            tokens = sum(h.tokens for h in self._users.values())
+            memory_bytes = sys.getsizeof(self._users) + sum(
+                sys.getsizeof(user_id)
+                + sys.getsizeof(h)
+                + sys.getsizeof(h.messages)
+                + sum(sys.getsizeof(m) + sys.getsizeof(m[1]) for m in h.messages)
+                for user_id, h in self._users.items()
+            )
+
+            return {
+                "users": len(self._users),
+                "messages": messages,
+                "tokens": tokens,
+                "memory_bytes": memory_bytes,
+                "evicted_users": self.evicted_users,
+            }
+
+
+def create_chat_history_store():
+    """Cria o backend configurado em CHAT_HISTORY_BACKEND ("memory" ou "redis")."""
+    if CHAT_HISTORY_BACKEND == "redis":
+        from src.history.redis_chat_history_store import RedisChatHistoryStore
+
+        return RedisChatHistoryStore()
+
+    return ChatHistoryStore()
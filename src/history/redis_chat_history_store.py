@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+
+import redis
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.history.chat_history_store import (
+    CHAT_HISTORY_IDLE_TTL,
+    CHAT_HISTORY_MAX_TOKENS,
+    CHAT_HISTORY_MAX_MESSAGE_TOKENS,
+    estimate_tokens,
+    truncate_to_tokens,
+)
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "40"))
+CHAT_HISTORY_KEY_PREFIX = os.getenv("CHAT_HISTORY_KEY_PREFIX", "chat_history:")
+
+# Cada mensagem vira um único valor da lista no Redis: 1 caractere de papel + texto.
+HUMAN_PREFIX = "H"
+AI_PREFIX = "A"
+
+
+class RedisChatHistoryStore:
+    """
+    Histórico de conversa compartilhado no Redis, para que qualquer réplica do
+    consumidor atenda qualquer usuário e um restart não apague as conversas.
+    Cada leitura e cada escrita de turno custa uma única ida ao Redis.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = REDIS_URL,
+        idle_ttl: int = CHAT_HISTORY_IDLE_TTL,
+        max_tokens: int = CHAT_HISTORY_MAX_TOKENS,
+        max_message_tokens: int = CHAT_HISTORY_MAX_MESSAGE_TOKENS,
+        max_messages: int = CHAT_HISTORY_MAX_MESSAGES,
+    ):
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.idle_ttl = idle_ttl
+        self.max_tokens = max_tokens
+        self.max_message_tokens = max_message_tokens
+        # Sempre par, para a lista nunca começar no meio de um turno.
+        self.max_messages = max(2, max_messages - max_messages % 2)
+        self._lock = threading.Lock()
+        self._reads = 0
+        self._writes = 0
+        self._time_spent = 0.0
+
+    def _key(self, user_id: str) -> str:
+        return f"{CHAT_HISTORY_KEY_PREFIX}{user_id}"
+
+    def _track(self, started: float, is_write: bool):
+        with self._lock:
+            self._time_spent += time.perf_counter() - started
+            if is_write:
+                self._writes += 1
+            else:
+                self._reads += 1
+
+    def get_messages(self, user_id: str) -> list:
+        """Retorna o histórico do usuário respeitando o orçamento de tokens."""
+        started = time.perf_counter()
+        key = self._key(user_id)
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, self.idle_ttl)
+        entries, _ = pipe.execute()
+        self._track(started, is_write=False)
+
+        # Percorre do mais novo para o mais antigo, em pares (pergunta + resposta),
+        # até estourar o orçamento; o último turno é sempre mantido.
+        kept = []
+        tokens = 0
+        for i in range(len(entries) - 2, -1, -2):
+            pair = entries[i : i + 2]
+            pair_tokens = sum(estimate_tokens(entry[1:]) for entry in pair)
+            if kept and tokens + pair_tokens > self.max_tokens:
+                break
+            kept[:0] = pair
+            tokens += pair_tokens
+
+        return [
+            HumanMessage(content=entry[1:])
+            if entry[0] == HUMAN_PREFIX
+            else AIMessage(content=entry[1:])
+            for entry in kept
+        ]
+
+    def append_turn(self, user_id: str, user_message: str, bot_response: str):
+        """Adiciona pergunta e resposta, corta a lista e renova o TTL numa só ida."""
+        user_message = truncate_to_tokens(user_message, self.max_message_tokens)
+        bot_response = truncate_to_tokens(bot_response, self.max_message_tokens)
+
+        started = time.perf_counter()
+        key = self._key(user_id)
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(key, HUMAN_PREFIX + user_message, AI_PREFIX + bot_response)
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.idle_ttl)
+        pipe.execute()
+        self._track(started, is_write=True)
+
+    def clear(self, user_id: str):
+        self.client.delete(self._key(user_id))
+
+    def stats(self) -> dict:
+        """Contadores de uso deste processo e memória usada pelo Redis."""
+        with self._lock:
+            operations = self._reads + self._writes
+            stats = {
+                "reads": self._reads,
+                "writes": self._writes,
+                "avg_ms": round(self._time_spent * 1000 / operations, 3)
+                if operations
+                else 0.0,
+            }
+
+        try:
+            stats["redis_memory_bytes"] = self.client.info("memory").get("used_memory")
+        except redis.RedisError as e:
+            stats["redis_memory_bytes"] = f"indisponível ({e})"
+
+        return stats